@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the render → pack → encode → transport pipeline.
+
+    python -m benchmark                      # run everything
+    python -m benchmark -k render -k 256     # only names containing "render" or "256"
+    python -m benchmark --save baseline.json
+    python -m benchmark --compare baseline.json --threshold 0.25
+
+Every benchmark reports ops/sec, latency percentiles and the peak memory of
+one call (tracemalloc). Transport benchmarks use pyserial's "loop://"
+loopback, so no hardware is needed.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from comm_library import (
+    commands_set_text,
+    commands_show_custom_imgs,
+    frames_to_bytes,
+    matrix_IMG_HxIMG_W_to_bytes,
+)
+from panel_profile import PanelProfile
+from text_to_frames import (
+    generate_led_frames,
+    image_to_led_matrices,
+    iter_led_frames,
+    render_text_to_strip,
+    load_led_font,
+    split_strip_into_frames,
+)
+
+
+SHORT_TEXT = "Vlak odjíždí 12:45"
+LONG_TEXT = " | ".join(
+    f"R{i} Praha hl.n. → Brno 12:{i % 60:02d} nástupiště {i % 7} zpoždění {i % 15} min"
+    for i in range(40)
+)
+# commands_set_text sends Latin-1 only
+PANEL_TEXT = "Train departs 12:45"
+PANEL_LONG_TEXT = " | ".join(f"R{i} Praha hl.n. - Brno 12:{i % 60:02d} platform {i % 7}" for i in range(40))
+TOKEN_TEXT = (
+    "{action_holdt}{font_sserif7}{color_rg}"
+    "EASE {color_yellow}- Effortless Algorithmic Solution Evolution "
+    "{wait_3s}{next_frame}{color_red}Frame 2 with time: {time}"
+)
+FRAME_COUNTS = (1, 10, 26)
+
+
+# ========================= WORKLOADS ===================================
+
+def _frames(count, profile):
+    """count frames of a typical scrolling message, as matrices."""
+    frames = generate_led_frames(LONG_TEXT * 2, "full", "yellow", renderer="atlas", profile=profile)
+    return (frames * (count // len(frames) + 1))[:count]
+
+
+def _workloads():
+    """
+    Yield (name, make) where make() prepares the input and returns the
+    zero-argument callable to time. Each workload renders for its own
+    PanelProfile, so 128 px and 256 px runs don't touch constants.IMG_W.
+    """
+    for width in PanelProfile.WIDTHS:
+        profile = PanelProfile(width=width)
+        for text_name, text in (("short", SHORT_TEXT), ("long", LONG_TEXT)):
+            for size in ("small", "medium", "full"):
+                for invert in (False, True):
+                    inv = "-invert" if invert else ""
+                    for renderer in ("pillow", "atlas"):
+                        yield (
+                            f"render/{renderer}/{text_name}/{size}{inv}/{width}",
+                            lambda t=text, s=size, i=invert, r=renderer, p=profile: (
+                                lambda: generate_led_frames(t, s, "yellow", invert=i, renderer=r, profile=p)
+                            ),
+                        )
+            yield (
+                f"render/lazy/{text_name}/full/{width}",
+                lambda t=text, p=profile: (
+                    lambda: list(iter_led_frames(t, "full", "yellow", packed=True, profile=p))
+                ),
+            )
+
+        def make_convert(profile=profile):
+            font = load_led_font("full")
+            strip = render_text_to_strip(LONG_TEXT, font, (255, 255, 0), False, profile=profile)
+            img = split_strip_into_frames(strip, profile)[1]
+            return lambda: image_to_led_matrices(img, profile)
+
+        yield f"convert/image_to_led_matrices/{width}", make_convert
+
+        def make_pack_matrix(profile=profile):
+            red, _ = _frames(1, profile)[0]
+            return lambda: matrix_IMG_HxIMG_W_to_bytes(red, profile)
+
+        yield f"pack/matrix_to_bytes/{width}", make_pack_matrix
+
+        for count in FRAME_COUNTS:
+            yield (
+                f"pack/frames_to_bytes/{count}/{width}",
+                lambda c=count, p=profile: (
+                    lambda frames: lambda: frames_to_bytes(frames, p)
+                )(_frames(c, p)),
+            )
+            yield (
+                f"encode/show_custom_imgs/{count}/{width}",
+                lambda c=count, p=profile: (
+                    lambda frames: lambda: commands_show_custom_imgs(frames, profile=p)
+                )(_frames(c, p)),
+            )
+            yield (
+                f"transport/loopback/{count}/{width}",
+                lambda c=count, p=profile: _make_transport(c, p),
+            )
+
+    yield "encode/set_text/short", lambda: lambda: commands_set_text(PANEL_TEXT)
+    yield "encode/set_text/tokens", lambda: lambda: commands_set_text(TOKEN_TEXT)
+    yield "encode/set_text/long", lambda: lambda: commands_set_text(PANEL_LONG_TEXT)
+
+
+def _make_transport(count, profile):
+    from panel_session import PanelSession
+
+    commands = commands_show_custom_imgs(frames_to_bytes(_frames(count, profile), profile), profile=profile)
+    session = PanelSession("loop://", skip_unchanged=False, profile=profile)
+    return lambda: session.send(commands)
+
+
+# ========================= RUNNER ======================================
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(fn, min_time=0.5, min_rounds=5, max_rounds=10000):
+    """Time fn repeatedly → dict of ops/sec, latency stats (seconds) and peak memory."""
+    fn()  # warm-up: font loading, atlases, caches
+
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_rounds:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if len(times) >= min_rounds and time.perf_counter() - started >= min_time:
+            break
+
+    # peak memory of a single call, measured apart from the timed rounds
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times.sort()
+    mean = sum(times) / len(times)
+    return {
+        "rounds": len(times),
+        "ops_per_sec": 1.0 / mean if mean else float("inf"),
+        "mean": mean,
+        "p50": _percentile(times, 50),
+        "p90": _percentile(times, 90),
+        "p99": _percentile(times, 99),
+        "peak_kib": peak / 1024,
+    }
+
+
+def run(patterns=(), min_time=0.5, out=sys.stdout):
+    """Run matching benchmarks; returns {name: result}."""
+    results = {}
+    for name, make in _workloads():
+        if patterns and not any(p in name for p in patterns):
+            continue
+        result = measure(make(), min_time=min_time)
+        results[name] = result
+        print(_format_row(name, result), file=out, flush=True)
+    return results
+
+
+def _format_row(name, r):
+    return (
+        f"{name:<42} {r['ops_per_sec']:>11.1f} ops/s"
+        f"  p50 {r['p50'] * 1e3:>9.3f} ms  p90 {r['p90'] * 1e3:>9.3f} ms"
+        f"  p99 {r['p99'] * 1e3:>9.3f} ms  peak {r['peak_kib']:>9.1f} KiB"
+    )
+
+
+# ========================= BASELINES ===================================
+
+def save_baseline(results, path):
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, threshold=0.2, out=sys.stdout):
+    """
+    Print p50 latency against the baseline; returns the names that got slower
+    by more than threshold (0.2 = 20 %).
+    """
+    regressions = []
+    print(f"\n{'benchmark':<42} {'baseline':>12} {'now':>12} {'change':>8}", file=out)
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<42} {'-':>12} {r['p50'] * 1e3:>9.3f} ms {'new':>8}", file=out)
+            continue
+        change = r["p50"] / base["p50"] - 1 if base["p50"] else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  SLOWER"
+            regressions.append(name)
+        elif change < -threshold:
+            mark = "  faster"
+        print(
+            f"{name:<42} {base['p50'] * 1e3:>9.3f} ms {r['p50'] * 1e3:>9.3f} ms {change:>+7.0%}{mark}",
+            file=out,
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__.splitlines()[1])
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="seconds to spend timing each benchmark (default 0.5)")
+    parser.add_argument("--save", metavar="FILE", help="save results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative p50 slowdown reported as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, _ in _workloads():
+            if not args.patterns or any(p in name for p in args.patterns):
+                print(name)
+        return 0
+
+    results = run(args.patterns, min_time=args.min_time)
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"\nBaseline saved to {args.save}")
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,351 @@
+from collections import OrderedDict
 from datetime import datetime
 import re
 import constants
+from panel_profile import resolve_profile
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, list-of-lists matrices work without it
+    np = None
 
 
 # HELPERS
 
+# any byte value → ASCII "0"/"1" of its lowest bit (works for 0/1 or 0/255)
+_LSB_TO_ASCII = bytes(0x30 | (v & 1) for v in range(256))
+
+# The panel nibble format 0011xxxx is exactly ASCII "0"–"9" followed by ":;<=>?",
+# so a lowercase hex string becomes panel bytes with a single translate().
+_HEX_TO_PANEL = bytes.maketrans(b"abcdef", b":;<=>?")
+_PANEL_TO_HEX = bytes.maketrans(b":;<=>?", b"abcdef")
+
+# ASCII "0"/"1" → 0/1
+_ASCII_TO_BIT = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def _ascii_bits_to_panel(bits):
+    """
+    Convert an ASCII "0"/"1" bit string (length divisible by 4) into
+    the 0011xxxx nibble stream. Runs entirely inside int/format/translate.
+    """
+    if not bits:
+        return b""
+    digits = len(bits) // 4
+    return format(int(bits, 2), f"0{digits}x").encode("ascii").translate(_HEX_TO_PANEL)
+
 
-def matrix_IMG_HxIMG_W_to_bytes(matrix):
+def _pack_ndarray(arr, width):
+    """
+    Pack a (..., IMG_H, width) NumPy array of 0/1 (or 0/255) values into
+    a (..., IMG_H*width/4) uint8 array of 0011xxxx bytes in one vectorized pass.
+    """
+    arr = np.asarray(arr)[..., :width]
+    bits = (arr & 1).astype(np.uint8)
+    quads = bits.reshape(bits.shape[:-1] + (-1, 4))
+    nibbles = (quads[..., 0] << 3) | (quads[..., 1] << 2) | (quads[..., 2] << 1) | quads[..., 3]
+    return (nibbles | 0x30).reshape(arr.shape[:-2] + (-1,))
+
+
+def _is_ndarray(obj):
+    return np is not None and isinstance(obj, np.ndarray)
+
+
+def matrix_IMG_HxIMG_W_to_bytes(matrix, profile=None):
     """
     Convert a 16×128 binary matrix into 512 bytes.
     Each 4 bits becomes: 0011xxxx
+
+    Accepts a list of lists or a NumPy array. A N×16×W NumPy stack is
+    packed in one pass and returned as the concatenated stream of all frames.
+    Rows are cut to the width of profile (panel_profile.PanelProfile).
+    """
+    width = resolve_profile(profile).width
+    if _is_ndarray(matrix) or (len(matrix) and _is_ndarray(matrix[0])):
+        return _pack_ndarray(matrix, width).tobytes()
+
+    bits = b"".join(bytes(row[:width]) for row in matrix).translate(_LSB_TO_ASCII)
+    return _ascii_bits_to_panel(bits)  # 512 bytes
+
+
+def packed_bits_to_bytes(data):
     """
-    out = bytearray()
+    Packed 1-bit rows (leftmost pixel in the highest bit, as in Pillow mode "1")
+    → 0011xxxx stream. Each packed byte is exactly two panel nibbles.
+    """
+    return data.hex().encode("ascii").translate(_HEX_TO_PANEL)
+
+
+def panel_bytes_to_packed_bits(data):
+    """Inverse of packed_bits_to_bytes: 0011xxxx stream → packed 1-bit rows."""
+    return bytes.fromhex(bytes(data).translate(_PANEL_TO_HEX).decode("ascii"))
+
+
+def lcd_array_to_bytes(img_red, img_green, profile=None):
+    profile = resolve_profile(profile)
+    return matrix_IMG_HxIMG_W_to_bytes(img_red, profile) + matrix_IMG_HxIMG_W_to_bytes(img_green, profile)
 
-    for row in matrix:
-        for i in range(0, constants.IMG_W, 4):
-            nib = 0
-            for b in row[i:i+4]:
-                nib = (nib << 1) | (b & 1)
-            out.append((0b0011 << 4) | nib)
 
-    return bytes(out)  # 512 bytes
+def bytes_to_matrix(data, width=None):
+    """
+    Inverse of matrix_IMG_HxIMG_W_to_bytes: 0011xxxx stream → IMG_H × IMG_W list of 0/1.
+    """
+    if width is None:
+        width = constants.IMG_W
+    if not data:
+        return []
+    digits = data.translate(_PANEL_TO_HEX)
+    bits = format(int(digits, 16), f"0{len(digits) * 4}b").encode("ascii").translate(_ASCII_TO_BIT)
+    return [list(bits[i:i + width]) for i in range(0, len(bits), width)]
 
 
-def lcd_array_to_bytes(img_red, img_green):
-    return matrix_IMG_HxIMG_W_to_bytes(img_red) + matrix_IMG_HxIMG_W_to_bytes(img_green)
+def bytes_to_frame(payload, width=None):
+    """Split one 1024-byte frame payload back into (red, green) matrices."""
+    half = len(payload) // 2
+    return bytes_to_matrix(payload[:half], width), bytes_to_matrix(payload[half:], width)
+
+
+def frames_to_bytes(imgs, profile=None):
+    """
+    Pack many frames at once → list of 1024-byte payloads (red + green).
+
+    imgs is either a list of (red, green) matrices or a NumPy array
+    of shape N×2×16×W; NumPy input is packed for all frames in one pass.
+    Entries that are already packed payloads (bytes) are passed through,
+    frame.Frame objects are packed from their bits.
+    """
+    profile = resolve_profile(profile)
+    if _is_ndarray(imgs):
+        packed = _pack_ndarray(imgs, profile.width)
+        return [frame.tobytes() for frame in packed.reshape(len(packed), -1)]
+
+    imgs = list(imgs)  # probed below before packing, iterators must not lose frames
+
+    if imgs and all(
+        isinstance(img, (tuple, list)) and _is_ndarray(img[0]) and _is_ndarray(img[1])
+        for img in imgs
+    ):
+        return frames_to_bytes(np.stack([np.stack(img) for img in imgs]), profile)
+
+    return [_frame_payload(img, profile) for img in imgs]
+
+
+def _frame_payload(img, profile):
+    """Payload of one frame: packed bytes, a frame.Frame or (red, green) matrices."""
+    if isinstance(img, (bytes, bytearray)):
+        return bytes(img)
+    if hasattr(img, "to_payload"):
+        return img.to_payload()
+    return lcd_array_to_bytes(img[0], img[1], profile)
+
+
+# TEXT ENCODING
+
+# mapping of tokens → byte sequences
+TEXT_TOKENS = {
+    # time/date
+    "{time}": constants.SHOW_TIME,
+    "{day_of_week}": constants.SHOW_DAY_OF_WEEK,
+    "{date_slash_mmddyy}": constants.SHOW_DATE_SLASH_MMDDYY,
+    "{date_slash_ddmmyy}": constants.SHOW_DATE_SLASH_DDMMYY,
+    "{date_dash_mmddyy}": constants.SHOW_DATE_DASH_MMDDYY,
+    "{date_dash_ddmmyy}": constants.SHOW_DATE_DASH_DDMMYY,
+    "{date_dot_mmddyy}": constants.SHOW_DATE_DOT_MMDDYY ,
+    "{date_dot_ddmmyy}": constants.SHOW_DATE_DOT_DDMMYY,
+    "{date_space_mmddyy}": constants.SHOW_DATE_SPACE_MMDDYY,
+    "{date_space_ddmmyy}": constants.SHOW_DATE_SPACE_DDMMYY,
+    "{date_mmmm_ddyyyy}": constants.SHOW_DATE_MMMM_DDYYYY,
+
+    # colors
+    "{color_red}": constants.COLOR_RED,
+    "{color_green}": constants.COLOR_GREEN,
+    "{color_yellow}": constants.COLOR_YELLOW,
+    "{color_rg}": constants.COLOR_RED_GREEN,
+    "{color_gr}": constants.COLOR_GREEN_RED,
+    "{color_rainbow1}": constants.COLOR_RAINBOW1,
+    "{color_rainbow2}": constants.COLOR_RAINBOW2,
+    "{color_mix}": constants.COLOR_MIX,
+
+    # fonts
+    "{font_sserif7}": constants.FONT_SSERIF7,
+    "{font_serif7}": constants.FONT_SERIF7,
+    "{font_serif12}": constants.FONT_SERIF12,
+    "{font_serif16}": constants.FONT_SERIF16,
+    "{font_sserif7_wide}": constants.FONT_SSERIF7_WIDE,
+    "{font_sserif7_double}": constants.FONT_SSERIF7_DOUBLE,
+    "{font_sserif7_dwide}": constants.FONT_SSERIF7_DWIDE,
+    "{font_serif7_double}": constants.FONT_SERIF7_DOUBLE,
+
+    # actions
+    "{action_none}": constants.ACTION_NONE,
+    "{action_flash}": constants.ACTION_FLASH,
+    "{action_flasht}": constants.ACTION_FLASH_TOP,
+    "{action_flashb}": constants.ACTION_FLASH_BOTTOM,
+    "{action_hold}": constants.ACTION_HOLD,
+    "{action_holdt}": constants.ACTION_HOLD_TOP,
+    "{action_holdb}": constants.ACTION_HOLD_BOTTOM,
+    "{action_interlock}": constants.ACTION_INTERLOCK,
+    "{action_shutter}": constants.ACTION_SHUTTER,
+    "{action_roll_in}": constants.ACTION_ROLL_IN,
+    "{action_roll_int}": constants.ACTION_ROLL_IN_TOP,
+    "{action_roll_inb}": constants.ACTION_ROLL_IN_BOTTOM,
+    "{action_roll_out}": constants.ACTION_ROLL_OUT,
+    "{action_roll_outt}": constants.ACTION_ROLL_OUT_TOP,
+    "{action_roll_outb}": constants.ACTION_ROLL_OUT_BOTTOM,
+    "{action_roll_left}": constants.ACTION_ROLL_LEFT,
+    "{action_roll_leftt}": constants.ACTION_ROLL_LEFT_TOP,
+    "{action_roll_leftb}": constants.ACTION_ROLL_LEFT_BOTTOM,
+    "{action_roll_right}": constants.ACTION_ROLL_RIGHT,
+    "{action_roll_rightt}": constants.ACTION_ROLL_RIGHT_TOP,
+    "{action_roll_rightb}": constants.ACTION_ROLL_RIGHT_BOTTOM,
+    "{action_roll_up}": constants.ACTION_ROLL_UP,
+    "{action_roll_upt}": constants.ACTION_ROLL_UP_TOP,
+    "{action_roll_upb}": constants.ACTION_ROLL_UP_BOTTOM,
+    "{action_roll_down}": constants.ACTION_ROLL_DOWN,
+    "{action_roll_downt}": constants.ACTION_ROLL_DOWN_TOP,
+    "{action_roll_downb}": constants.ACTION_ROLL_DOWN_BOTTOM,
+
+    "{action_rotate}": constants.ACTION_ROTATE,
+    "{action_rotatet}": constants.ACTION_ROTATE_TOP,
+    "{action_rotateb}": constants.ACTION_ROTATE_BOTTOM,
+    "{action_scroll}": constants.ACTION_SCROLL,
+    "{action_scrollt}": constants.ACTION_SCROLL_TOP,
+    "{action_scrollb}": constants.ACTION_SCROLL_BOTTOM,
+    "{action_slide}": constants.ACTION_SLIDE,
+    "{action_slidet}": constants.ACTION_SLIDE_TOP,
+    "{action_slideb}": constants.ACTION_SLIDE_BOTTOM,
+    "{action_snow}": constants.ACTION_SNOW,
+    "{action_snowt}": constants.ACTION_SNOW_TOP,
+    "{action_snowb}": constants.ACTION_SNOW_BOTTOM,
+    "{action_sparkle}": constants.ACTION_SPARKLE,
+    "{action_sparklet}": constants.ACTION_SPARKLE_TOP,
+    "{action_sparkleb}": constants.ACTION_SPARKLE_BOTTOM,
+    "{action_spray}": constants.ACTION_SPRAY,
+    "{action_sprayt}": constants.ACTION_SPRAY_TOP,
+    "{action_sprayb}": constants.ACTION_SPRAY_BOTTOM,
+    "{action_starburst}": constants.ACTION_STARBURST,
+    "{action_starburstt}": constants.ACTION_STARBURST_TOP,
+    "{action_starburstb}": constants.ACTION_STARBURST_BOTTOM,
+    "{action_switch}": constants.ACTION_SWITCH,
+    "{action_switcht}": constants.ACTION_SWITCH_TOP,
+    "{action_switchb}": constants.ACTION_SWITCH_BOTTOM,
+    "{action_twinkle}": constants.ACTION_TWINKLE,
+    "{action_twinklet}": constants.ACTION_TWINKLE_TOP,
+    "{action_twinkleb}": constants.ACTION_TWINKLE_BOTTOM,
+    "{action_wipe_left}": constants.ACTION_WIPE_LEFT,
+    "{action_wipe_leftt}": constants.ACTION_WIPE_LEFT_TOP,
+    "{action_wipe_leftb}": constants.ACTION_WIPE_LEFT_BOTTOM,
+    "{action_wipe_right}": constants.ACTION_WIPE_RIGHT,
+    "{action_wipe_rightt}": constants.ACTION_WIPE_RIGHT_TOP,
+    "{action_wipe_rightb}": constants.ACTION_WIPE_RIGHT_BOTTOM,
+    "{action_wipe_up}": constants.ACTION_WIPE_UP,
+    "{action_wipe_upt}": constants.ACTION_WIPE_UP_TOP,
+    "{action_wipe_upb}": constants.ACTION_WIPE_UP_BOTTOM,
+    "{action_wipe_down}": constants.ACTION_WIPE_DOWN,
+    "{action_wipe_downt}": constants.ACTION_WIPE_DOWN_TOP,
+    "{action_wipe_downb}": constants.ACTION_WIPE_DOWN_BOTTOM,
+    "{action_wipe_in}": constants.ACTION_WIPE_IN,
+    "{action_wipe_int}": constants.ACTION_WIPE_IN_TOP,
+    "{action_wipe_inb}": constants.ACTION_WIPE_IN_BOTTOM,
+    "{action_wipe_out}": constants.ACTION_WIPE_OUT,
+    "{action_wipe_outt}": constants.ACTION_WIPE_OUT_TOP,
+    "{action_wipe_outb}": constants.ACTION_WIPE_OUT_BOTTOM,
+    "{action_wipe_middle}": constants.ACTION_WIPE_MIDDLE,
+    "{action_wipe_middlet}": constants.ACTION_WIPE_MIDDLE_TOP,
+    "{action_wipe_middleb}": constants.ACTION_WIPE_MIDDLE_BOTTOM,
+
+
+    # wait
+    "{wait_0s}": constants.WAIT_0S,
+    "{wait_1s}": constants.WAIT_1S,
+    "{wait_2s}": constants.WAIT_2S,
+    "{wait_3s}": constants.WAIT_3S,
+    "{wait_4s}": constants.WAIT_4S,
+    "{wait_5s}": constants.WAIT_5S,
+
+
+    # settings
+    "{next_frame}": constants.NEXT_FRAME,
+}
+
+
+class TextCodec:
+    """
+    Precompiled encoder for text commands.
+
+    The token pattern is compiled once from the token_map keys and the
+    instance holds no mutable state after construction, so a single codec
+    can be shared between threads. Anything that is not a key is plain text.
+    """
+
+    def __init__(self, token_map):
+        self.token_map = dict(token_map)
+        if not all(isinstance(name, str) and name for name in self.token_map):
+            raise ValueError("Token names must be non-empty strings")
+        # longest first, so a token that starts with another one still wins
+        names = sorted(self.token_map, key=len, reverse=True)
+        self._token_pattern = re.compile(
+            "(" + "|".join(map(re.escape, names)) + ")" if names else "((?!))"
+        )
+        self._prefix = constants.WRITE_START + constants.WRITE_TEXT
+        self._suffix = constants.WRITE_END
+
+    def tokenize(self, text):
+        """Split text into ("token", name) / ("text", value) parts."""
+        parts = []
+        for i, value in enumerate(self._token_pattern.split(text)):
+            if not value:
+                continue
+            if i % 2:
+                parts.append(("token", value))
+            elif parts and parts[-1][0] == "text":
+                parts[-1] = ("text", parts[-1][1] + value)
+            else:
+                parts.append(("text", value))
+        return parts
+
+    def encode(self, text: str) -> bytes:
+        """
+        Encode text with tokens into WRITE_START + WRITE_TEXT + payload + WRITE_END.
+        Tokens and plain text are resolved in one pass over the split text and
+        joined into a single buffer sized up front.
+        """
+        tokens = self.token_map
+        chunks = [self._prefix]
+
+        for i, value in enumerate(self._token_pattern.split(text)):
+            if i % 2:
+                chunks.append(tokens[value])
+            elif value:
+                try:
+                    chunks.append(value.encode("latin-1"))  # plain text → raw bytes
+                except UnicodeEncodeError as e:
+                    raise ValueError(
+                        f"Character {value[e.start]!r} cannot be sent as panel text"
+                    ) from e
+
+        chunks.append(self._suffix)
+        return b"".join(chunks)
+
+    def encode_many(self, texts) -> list:
+        """Encode several texts, returns one payload per text."""
+        return [self.encode(text) for text in texts]
+
+    def commands(self, text: str) -> list:
+        return [self.encode(text), constants.CONFIRMATION]
+
+
+TEXT_CODEC = TextCodec(TEXT_TOKENS)
 
 
 # COMMANDS
+
+# image packet: ".]!Z00]\"S" + slot label + size + 1024-byte frame + "]$]$"
+IMG_PACKET_LEAD_IN = bytes.fromhex("2e 5d 21 5a 30 30 5d 22 53")
+CLEAR_MEMORY = bytes.fromhex("5d 21 5a 30 30 5d 22 58 5d 24")
+SET_WIDTH_PREFIX = bytes.fromhex("5d 21 5a 30 30 5d 22 59")
+
+
 def commands_set_text(text: str) -> list:
     """
     Build a text command:
@@ -36,188 +354,110 @@ def commands_set_text(text: str) -> list:
         + WRITE_END
     Followed by CONFIRMATION.
     """
-
-    # mapping of tokens → byte sequences
-    token_map = {
-        # time/date
-        "{time}": constants.SHOW_TIME,
-        "{day_of_week}": constants.SHOW_DAY_OF_WEEK,
-        "{date_slash_mmddyy}": constants.SHOW_DATE_SLASH_MMDDYY,
-        "{date_slash_ddmmyy}": constants.SHOW_DATE_SLASH_DDMMYY,
-        "{date_dash_mmddyy}": constants.SHOW_DATE_DASH_MMDDYY,
-        "{date_dash_ddmmyy}": constants.SHOW_DATE_DASH_DDMMYY,
-        "{date_dot_mmddyy}": constants.SHOW_DATE_DOT_MMDDYY ,
-        "{date_dot_ddmmyy}": constants.SHOW_DATE_DOT_DDMMYY,
-        "{date_space_mmddyy}": constants.SHOW_DATE_SPACE_MMDDYY,
-        "{date_space_ddmmyy}": constants.SHOW_DATE_SPACE_DDMMYY,
-        "{date_mmmm_ddyyyy}": constants.SHOW_DATE_MMMM_DDYYYY,
-
-        # colors
-        "{color_red}": constants.COLOR_RED,
-        "{color_green}": constants.COLOR_GREEN,
-        "{color_yellow}": constants.COLOR_YELLOW,
-        "{color_rg}": constants.COLOR_RED_GREEN,
-        "{color_gr}": constants.COLOR_GREEN_RED,
-        "{color_rainbow1}": constants.COLOR_RAINBOW1,
-        "{color_rainbow2}": constants.COLOR_RAINBOW2,
-        "{color_mix}": constants.COLOR_MIX,
-
-        # fonts
-        "{font_sserif7}": constants.FONT_SSERIF7,
-        "{font_serif7}": constants.FONT_SERIF7,
-        "{font_serif12}": constants.FONT_SERIF12,
-        "{font_serif16}": constants.FONT_SERIF16,
-        "{font_sserif7_wide}": constants.FONT_SSERIF7_WIDE,
-        "{font_sserif7_double}": constants.FONT_SSERIF7_DOUBLE,
-        "{font_sserif7_dwide}": constants.FONT_SSERIF7_DWIDE,
-        "{font_serif7_double}": constants.FONT_SERIF7_DOUBLE,
-
-        # actions
-        "{action_none}": constants.ACTION_NONE,
-        "{action_flash}": constants.ACTION_FLASH,
-        "{action_flasht}": constants.ACTION_FLASH_TOP,
-        "{action_flashb}": constants.ACTION_FLASH_BOTTOM,
-        "{action_hold}": constants.ACTION_HOLD,
-        "{action_holdt}": constants.ACTION_HOLD_TOP,
-        "{action_holdb}": constants.ACTION_HOLD_BOTTOM,
-        "{action_interlock}": constants.ACTION_INTERLOCK,
-        "{action_shutter}": constants.ACTION_SHUTTER,
-        "{action_roll_in}": constants.ACTION_ROLL_IN,
-        "{action_roll_int}": constants.ACTION_ROLL_IN_TOP,
-        "{action_roll_inb}": constants.ACTION_ROLL_IN_BOTTOM,
-        "{action_roll_out}": constants.ACTION_ROLL_OUT,
-        "{action_roll_outt}": constants.ACTION_ROLL_OUT_TOP,
-        "{action_roll_outb}": constants.ACTION_ROLL_OUT_BOTTOM,
-        "{action_roll_left}": constants.ACTION_ROLL_LEFT,
-        "{action_roll_leftt}": constants.ACTION_ROLL_LEFT_TOP,
-        "{action_roll_leftb}": constants.ACTION_ROLL_LEFT_BOTTOM,
-        "{action_roll_right}": constants.ACTION_ROLL_RIGHT,
-        "{action_roll_rightt}": constants.ACTION_ROLL_RIGHT_TOP,
-        "{action_roll_rightb}": constants.ACTION_ROLL_RIGHT_BOTTOM,
-        "{action_roll_up}": constants.ACTION_ROLL_UP,
-        "{action_roll_upt}": constants.ACTION_ROLL_UP_TOP,
-        "{action_roll_upb}": constants.ACTION_ROLL_UP_BOTTOM,
-        "{action_roll_down}": constants.ACTION_ROLL_DOWN,
-        "{action_roll_downt}": constants.ACTION_ROLL_DOWN_TOP,
-        "{action_roll_downb}": constants.ACTION_ROLL_DOWN_BOTTOM,
-
-        "{action_rotate}": constants.ACTION_ROTATE,
-        "{action_rotatet}": constants.ACTION_ROTATE_TOP,
-        "{action_rotateb}": constants.ACTION_ROTATE_BOTTOM,
-        "{action_scroll}": constants.ACTION_SCROLL,
-        "{action_scrollt}": constants.ACTION_SCROLL_TOP,
-        "{action_scrollb}": constants.ACTION_SCROLL_BOTTOM,
-        "{action_slide}": constants.ACTION_SLIDE,
-        "{action_slidet}": constants.ACTION_SLIDE_TOP,
-        "{action_slideb}": constants.ACTION_SLIDE_BOTTOM,
-        "{action_snow}": constants.ACTION_SNOW,
-        "{action_snowt}": constants.ACTION_SNOW_TOP,
-        "{action_snowb}": constants.ACTION_SNOW_BOTTOM,
-        "{action_sparkle}": constants.ACTION_SPARKLE,
-        "{action_sparklet}": constants.ACTION_SPARKLE_TOP,
-        "{action_sparkleb}": constants.ACTION_SPARKLE_BOTTOM,
-        "{action_spray}": constants.ACTION_SPRAY,
-        "{action_sprayt}": constants.ACTION_SPRAY_TOP,
-        "{action_sprayb}": constants.ACTION_SPRAY_BOTTOM,
-        "{action_starburst}": constants.ACTION_STARBURST,
-        "{action_starburstt}": constants.ACTION_STARBURST_TOP,
-        "{action_starburstb}": constants.ACTION_STARBURST_BOTTOM,
-        "{action_switch}": constants.ACTION_SWITCH,
-        "{action_switcht}": constants.ACTION_SWITCH_TOP,
-        "{action_switchb}": constants.ACTION_SWITCH_BOTTOM,
-        "{action_twinkle}": constants.ACTION_TWINKLE,
-        "{action_twinklet}": constants.ACTION_TWINKLE_TOP,
-        "{action_twinkleb}": constants.ACTION_TWINKLE_BOTTOM,
-        "{action_wipe_left}": constants.ACTION_WIPE_LEFT,
-        "{action_wipe_leftt}": constants.ACTION_WIPE_LEFT_TOP,
-        "{action_wipe_leftb}": constants.ACTION_WIPE_LEFT_BOTTOM,
-        "{action_wipe_right}": constants.ACTION_WIPE_RIGHT,
-        "{action_wipe_rightt}": constants.ACTION_WIPE_RIGHT_TOP,
-        "{action_wipe_rightb}": constants.ACTION_WIPE_RIGHT_BOTTOM,
-        "{action_wipe_up}": constants.ACTION_WIPE_UP,
-        "{action_wipe_upt}": constants.ACTION_WIPE_UP_TOP,
-        "{action_wipe_upb}": constants.ACTION_WIPE_UP_BOTTOM,
-        "{action_wipe_down}": constants.ACTION_WIPE_DOWN,
-        "{action_wipe_downt}": constants.ACTION_WIPE_DOWN_TOP,
-        "{action_wipe_downb}": constants.ACTION_WIPE_DOWN_BOTTOM,
-        "{action_wipe_in}": constants.ACTION_WIPE_IN,
-        "{action_wipe_int}": constants.ACTION_WIPE_IN_TOP,
-        "{action_wipe_inb}": constants.ACTION_WIPE_IN_BOTTOM,
-        "{action_wipe_out}": constants.ACTION_WIPE_OUT,
-        "{action_wipe_outt}": constants.ACTION_WIPE_OUT_TOP,
-        "{action_wipe_outb}": constants.ACTION_WIPE_OUT_BOTTOM,
-        "{action_wipe_middle}": constants.ACTION_WIPE_MIDDLE,
-        "{action_wipe_middlet}": constants.ACTION_WIPE_MIDDLE_TOP,
-        "{action_wipe_middleb}": constants.ACTION_WIPE_MIDDLE_BOTTOM,
-
-
-        # wait
-        "{wait_0s}": constants.WAIT_0S,
-        "{wait_1s}": constants.WAIT_1S,
-        "{wait_2s}": constants.WAIT_2S,
-        "{wait_3s}": constants.WAIT_3S,
-        "{wait_4s}": constants.WAIT_4S,
-        "{wait_5s}": constants.WAIT_5S,
-
-
-        # settings
-        "{next_frame}": constants.NEXT_FRAME,
-    }
-
-    # regex matching any token name
-    pattern = re.compile(
-        "(" + "|".join(re.escape(t) for t in token_map.keys()) + ")"
-    )
-
-    # Split text into token or plain segments
-    parts = []
-    idx = 0
-
-    for match in pattern.finditer(text):
-        start, end = match.span()
-
-        # plain text before token
-        if start > idx:
-            parts.append(("text", text[idx:start]))
-
-        # the token
-        parts.append(("token", match.group(1)))
-
-        idx = end
-
-    # trailing plain text
-    if idx < len(text):
-        parts.append(("text", text[idx:]))
-
-    # --- Construct the binary payload ---
-    data = bytearray()
-
-    data += constants.WRITE_START
-    data += constants.WRITE_TEXT
-
-    for kind, value in parts:
-        if kind == "token":
-            data += token_map[value]
-
-        else:  # plain ASCII → hex
-            hex_string = " ".join(f"{ord(c):02x}" for c in value)
-            data += bytes.fromhex(hex_string)
-
-    data += constants.WRITE_END
-
-    return [
-        bytes(data),
-        constants.CONFIRMATION
-    ]
+    return TEXT_CODEC.commands(text)
 
 
-def commands_show_custom_imgs(imgs):
+def commands_show_custom_imgs(imgs, slots=None, profile=None, dedup=True):
     """
     Return list of PACKETS (bytes) ready to send.
     Each packet is bytes: ASCII header + binary frame + ASCII footer.
+    imgs are (red, green) matrices, frame.Frame objects or already packed
+    1024-byte payloads. Frames go to slots a, b, c, ... (or the given slots);
+    more frames than the profile's slot labels raise ValueError.
+
+    With dedup (and no explicit slots) identical frames - blank ones
+    included - are uploaded once and the header shows their slot again
+    (see dedup_frames).
+    """
+    profile = resolve_profile(profile)
+    if dedup and slots is None:
+        unique, order = dedup_frames(imgs, profile)
+        labels = slot_labels(len(unique), profile.slot_labels)
+        commands = [playlist_header([labels[i] for i in order], profile)]
+        commands.extend(bytes(packet) for packet in _iter_image_packets(unique, labels, profile))
+        commands.append(constants.CONFIRMATION)
+        return commands
+    if _is_ndarray(imgs):
+        imgs = frames_to_bytes(imgs, profile)  # whole stack packed in one pass
+    return [bytes(packet) for packet in iter_show_custom_imgs(imgs, slots=slots, profile=profile)]
+
+
+def dedup_frames(imgs, profile=None):
+    """
+    Pre-upload optimization → (unique, order): the distinct frame payloads
+    in first-use order and, per frame to show, its index into unique.
+    Every frame stays in the playlist (blank frames are deliberate pauses),
+    repeats just point at one stored slot; each repeat saves ~1 s at 9600 bps.
+    """
+    payloads = frames_to_bytes(imgs, profile)
+    index = {}
+    order = [index.setdefault(p, len(index)) for p in payloads]
+    return list(index), order
+
+
+def iter_show_custom_imgs(imgs, count=None, slots=None, profile=None):
+    """
+    Streaming variant of commands_show_custom_imgs: yields the header, one
+    packet per frame and the footer, packing each frame only when the previous
+    packet has been consumed. imgs may be any iterable (e.g. a lazy frame
+    generator); count is then required, as the header lists every slot.
+    slots optionally names the slot label of each frame (default a, b, c, ...).
+
+    Frame packets are memoryviews of one reused buffer - write (or copy) each
+    packet before asking for the next one.
     """
-    if len(imgs) == 1:
-        if constants.IMG_W == 128:
+    profile = resolve_profile(profile)
+    if slots is None:
+        if count is None:
+            try:
+                count = len(imgs)
+            except TypeError:
+                raise ValueError("count is required when imgs has no len()")
+        slots = slot_labels(count, profile.slot_labels)
+    else:
+        slots = list(slots)
+        _check_slots(slots, profile.slot_labels)
+
+    yield playlist_header(slots, profile)
+    yield from _iter_image_packets(imgs, slots, profile)
+    yield constants.CONFIRMATION
+
+
+def commands_show_playlist(slots, profile=None):
+    """
+    Show frames already stored on the panel: only the short header packet
+    listing slots (labels, repeats allowed) + CONFIRMATION, no image data.
+    """
+    profile = resolve_profile(profile)
+    slots = list(slots)
+    _check_slots(slots, profile.slot_labels)
+    return [playlist_header(slots, profile), constants.CONFIRMATION]
+
+
+def slot_labels(count, labels=None):
+    """Labels of the first count frame slots; ValueError if the panel has fewer."""
+    if labels is None:
+        labels = constants.SLOT_LABELS
+    if count > len(labels):
+        raise ValueError(
+            f"{count} frames don't fit into the panel's {len(labels)} frame slots "
+            f"({labels[0]}–{labels[-1]})"
+        )
+    return list(labels[:count])
+
+
+def _check_slots(slots, labels=None):
+    if labels is None:
+        labels = constants.SLOT_LABELS
+    for label in slots:
+        if label not in labels or len(label) != 1:
+            raise ValueError(f"Invalid frame slot {label!r}, valid slots are {labels[0]}–{labels[-1]}")
+
+
+def playlist_header(slots, profile=None):
+    """Header packet: the "Z" text file showing the given frame slots in order."""
+    if len(slots) == 1:
+        if resolve_profile(profile).width == 128:
             lead_in = bytes.fromhex("5d 21 5a 30 30 5d 22 41 5a 5d 3b 20 62 5d 35")
         else:
             lead_in = bytes.fromhex("5d 21 5a 30 30 5d 22 41 5a 5d 3b 20 67 5d 29")
@@ -225,51 +465,144 @@ def commands_show_custom_imgs(imgs):
         lead_in = bytes.fromhex("5d 21 5a 30 30 5d 22 41 5a 5d 3b 20 67")
     iter_start = bytes.fromhex("5d 3f 50")
     lead_out = bytes.fromhex("5d 24 5d 24")
-    footer = constants.CONFIRMATION
-
-    img_lead_in = bytes.fromhex("2e 5d 21 5a 30 30 5d 22 53")
-    if constants.IMG_W == 128:
-        img_lead_in_end = bytes.fromhex("32 40")
-    else:
-        img_lead_in_end = bytes.fromhex("32 50")
-
-    commands = []
 
     # ---------- BUILD HEADER (ASCII ONLY) ----------
     header = bytearray()
     header.extend(lead_in)
 
-    iterator = 97
-    for i in range(len(imgs)):
+    for i, label in enumerate(slots):
         header.extend(iter_start)
-        header.append(iterator)   # raw character 'a', 'b', 'c'
-        if i < len(imgs)-1:
+        header.append(ord(label))   # raw character 'a', 'b', 'c'
+        if i < len(slots)-1:
             header.extend(constants.WAIT_0S)
-        iterator += 1
 
     header.extend(lead_out)
-    commands.append(bytes(header))
+    return bytes(header)
+
 
-    # ---------- BUILD IMAGE PACKETS ----------
-    iterator = 97
+def _iter_image_packets(imgs, slots, profile):
+    lead_out = bytes.fromhex("5d 24 5d 24")
+    img_lead_in = IMG_PACKET_LEAD_IN
+    if profile.width == 128:
+        img_lead_in_end = bytes.fromhex("32 40")
+    else:
+        img_lead_in_end = bytes.fromhex("32 50")
+
+    # ---------- STREAM IMAGE PACKETS ----------
+    # one preallocated packet, only the slot byte and the frame are rewritten
+    half = profile.channel_bytes
+    body = len(img_lead_in) + 1 + len(img_lead_in_end)
+    packet = bytearray(body + 2 * half + len(lead_out))
+    packet[:len(img_lead_in)] = img_lead_in
+    packet[body - len(img_lead_in_end):body] = img_lead_in_end
+    packet[body + 2 * half:] = lead_out
+    view = memoryview(packet)
+    slot = len(img_lead_in)
+
+    count = len(slots)
+    sent = 0
     for img in imgs:
-        red, green = img
-        frame_bytes = lcd_array_to_bytes(red, green)  # 1024 raw bytes!
+        if sent == count:
+            raise ValueError(f"More than count={count} frames given")
+        packet[slot] = ord(slots[sent])
+        if hasattr(img, "to_payload"):
+            img = img.to_payload()
+        if isinstance(img, (bytes, bytearray, memoryview)):
+            if len(img) != 2 * half:
+                raise ValueError(f"Packed frame must be {2 * half} bytes, got {len(img)}")
+            view[body:body + 2 * half] = img       # *** RAW BYTES ***
+        else:
+            view[body:body + half] = matrix_IMG_HxIMG_W_to_bytes(img[0], profile)
+            view[body + half:body + 2 * half] = matrix_IMG_HxIMG_W_to_bytes(img[1], profile)
+        yield view
+        sent += 1
 
-        packet = bytearray()
-        packet.extend(img_lead_in)
-        packet.append(iterator)
-        packet.extend(img_lead_in_end)
-        packet.extend(frame_bytes)    # *** RAW BYTES ***
-        packet.extend(lead_out)
+    if sent != count:
+        raise ValueError(f"Expected {count} frames, got {sent}")
 
-        commands.append(bytes(packet))
-        iterator += 1
 
-    # ---------- FINAL FOOTER ----------
-    commands.append(footer)
+# SLOT ALLOCATION
 
-    return commands
+class SlotAllocator:
+    """
+    Keeps track of which frame is stored in which slot of one panel, so that
+    messages can share uploaded frames and switching back to known content
+    only needs the header packet.
+
+    Frames are identified by their payload. New frames take a free slot, or
+    the least recently shown slot that the current message doesn't use.
+    Call clear() whenever the panel memory is lost (clear memory, reconnect).
+    """
+
+    def __init__(self, labels=None, profile=None):
+        self.profile = resolve_profile(profile)
+        self.labels = self.profile.slot_labels if labels is None else labels
+        self._stored = OrderedDict()   # label → payload, least recently shown first
+        self._by_payload = {}
+
+    def assign(self, imgs):
+        """
+        Choose slots for imgs → (slots, uploads): the slot of every frame in
+        order, and the (slot, payload) pairs the panel doesn't hold yet.
+        """
+        payloads = frames_to_bytes(imgs, self.profile)
+        needed = list(dict.fromkeys(payloads))
+        if len(needed) > len(self.labels):
+            raise ValueError(
+                f"{len(needed)} different frames don't fit into the panel's {len(self.labels)} "
+                f"frame slots ({self.labels[0]}–{self.labels[-1]})"
+            )
+
+        keep = {self._by_payload[p] for p in needed if p in self._by_payload}
+        uploads = []
+        for payload in needed:
+            if payload in self._by_payload:
+                continue
+            label = self._free_label(keep)
+            self._store(label, payload)
+            keep.add(label)
+            uploads.append((label, payload))
+
+        slots = [self._by_payload[p] for p in payloads]
+        for label in dict.fromkeys(slots):
+            self._stored.move_to_end(label)
+        return slots, uploads
+
+    def commands(self, imgs):
+        """Header for imgs + packets for frames not stored yet + CONFIRMATION."""
+        slots, uploads = self.assign(imgs)
+        commands = [playlist_header(slots, self.profile)]
+        commands.extend(
+            bytes(p) for p in _iter_image_packets(
+                [p for _, p in uploads], [s for s, _ in uploads], self.profile
+            )
+        )
+        commands.append(constants.CONFIRMATION)
+        return commands
+
+    def stored(self):
+        """{slot label: payload} the panel holds, as far as this allocator knows."""
+        return dict(self._stored)
+
+    def clear(self):
+        self._stored.clear()
+        self._by_payload.clear()
+
+    def _free_label(self, keep):
+        for label in self.labels:
+            if label not in self._stored:
+                return label
+        for label in self._stored:   # least recently shown first
+            if label not in keep:
+                return label
+        raise ValueError("No free frame slot")  # assign() checked the count
+
+    def _store(self, label, payload):
+        old = self._stored.pop(label, None)
+        if old is not None:
+            del self._by_payload[old]
+        self._stored[label] = payload
+        self._by_payload[payload] = label
 
 
 def commands_set_time_and_date(time: str = None, date: str = None) -> list:
@@ -322,6 +655,19 @@ def commands_set_width(width: int = 128) -> list:
 
 def commands_clear_memory():
 
-    cmd = bytes.fromhex("5d 21 5a 30 30 5d 22 58 5d 24")
+    return [CLEAR_MEMORY]
+
+
+# PACKET INSPECTION
+
+def image_packet_slot(packet):
+    """Slot label ('a', 'b', ...) of an image packet, None for other commands."""
+    lead = len(IMG_PACKET_LEAD_IN)
+    if len(packet) > lead and packet[:lead] == IMG_PACKET_LEAD_IN:
+        return chr(packet[lead])
+    return None
+
 
-    return [cmd]
+def resets_frame_memory(cmd):
+    """True for commands after which the panel's stored images can't be trusted."""
+    return cmd == CLEAR_MEMORY or cmd[:len(SET_WIDTH_PREFIX)] == SET_WIDTH_PREFIX
@@ -2,6 +2,9 @@
 IMG_W = 128
 IMG_H = 16
 
+# Frame slots: labels of the stored images a playlist can show (one byte each)
+SLOT_LABELS = "abcdefghijklmnopqrstuvwxyz"
+
 # Communication
 CONFIRMATION = bytes.fromhex("2e 5d 21 5a 30 30 5d 22 45 2e 20 20 5a 5d 24 5d 24")
 
@@ -0,0 +1,235 @@
+import functools
+
+import constants
+from comm_library import (
+    _ASCII_TO_BIT,
+    _LSB_TO_ASCII,
+    np,
+    packed_bits_to_bytes,
+    panel_bytes_to_packed_bits,
+)
+
+
+def _pack_rows(matrix, width):
+    """IMG_H × width matrix of 0/1 (lists or NumPy) → packed bits, leftmost pixel = highest bit."""
+    if np is not None and isinstance(matrix, np.ndarray):
+        return np.packbits(np.asarray(matrix, dtype=np.uint8) & 1, axis=-1).tobytes()
+    stride = (width + 7) // 8
+    pad = "0" * (stride * 8 - width)
+    return b"".join(
+        int(bytes(row[:width]).translate(_LSB_TO_ASCII).decode("ascii") + pad, 2).to_bytes(stride, "big")
+        for row in matrix
+    )
+
+
+def _unpack_rows(data, width, height):
+    """Packed bits → height × width list of 0/1."""
+    if not height:
+        return []
+    stride = (width + 7) // 8
+    bits = format(int.from_bytes(data, "big"), f"0{len(data) * 8}b").encode("ascii")
+    bits = bits.translate(_ASCII_TO_BIT)
+    return [list(bits[y * stride * 8:y * stride * 8 + width]) for y in range(height)]
+
+
+@functools.lru_cache(maxsize=256)
+def _column_mask(width, height, start, stop):
+    """Int mask of columns start … stop-1 in every row of a packed channel."""
+    stride = (width + 7) // 8
+    start, stop = max(start, 0), min(stop, width)
+    if start >= stop:
+        return 0
+    row = ((1 << (stop - start)) - 1) << (stride * 8 - stop)
+    return int.from_bytes(row.to_bytes(stride, "big") * height, "big")
+
+
+def _shift_channel(data, width, height, dx):
+    """Move every row of a packed channel dx columns right (negative: left)."""
+    if not dx:
+        return data
+    bits = int.from_bytes(data, "big")
+    # rows are contiguous in the int, so whatever crosses into a neighbouring
+    # row lands in the vacated columns and is masked off
+    bits = bits >> dx if dx > 0 else bits << -dx
+    bits &= _column_mask(width, height, dx, width + dx)
+    return bits.to_bytes(len(data), "big")
+
+
+# ========================= FRAME =======================================
+
+class Frame:
+    """
+    One panel frame with both channels stored as packed bits: height rows of
+    (width + 7) // 8 bytes, leftmost pixel in the highest bit (the layout of
+    Pillow mode "1" and of the panel payload). Treated as immutable: cheap
+    to compare and hash, and ~50× smaller than the legacy (red, green)
+    tuple of lists (0.6 KiB instead of ~34 KiB at 128 px).
+    """
+
+    __slots__ = ("red", "green", "width", "height", "_hash")
+
+    def __init__(self, red, green, width=None, height=None):
+        if width is None:
+            width = constants.IMG_W
+        if height is None:
+            height = constants.IMG_H
+        size = (width + 7) // 8 * height
+        red = bytes(red)
+        green = bytes(green)
+        if len(red) != size or len(green) != size:
+            raise ValueError(f"A {width}×{height} frame needs {size} bytes per channel")
+        self.red = red
+        self.green = green
+        self.width = width
+        self.height = height
+        self._hash = None
+
+    # ------------------------------------------------------------------ constructors
+    @classmethod
+    def blank(cls, width=None, height=None):
+        width = constants.IMG_W if width is None else width
+        height = constants.IMG_H if height is None else height
+        empty = bytes((width + 7) // 8 * height)
+        return cls(empty, empty, width, height)
+
+    @classmethod
+    def from_matrices(cls, red, green):
+        """From IMG_H × IMG_W matrices of 0/1 (lists or NumPy arrays)."""
+        height = len(red)
+        width = len(red[0]) if height else constants.IMG_W
+        return cls(_pack_rows(red, width), _pack_rows(green, width), width, height)
+
+    @classmethod
+    def from_tuple(cls, frame):
+        """From a legacy (red, green) tuple as returned by generate_led_frames."""
+        red, green = frame
+        return cls.from_matrices(red, green)
+
+    @classmethod
+    def from_payload(cls, payload, width=None, height=None):
+        """From a panel payload (0011xxxx red half + green half)."""
+        half = len(payload) // 2
+        height = constants.IMG_H if height is None else height
+        if width is None:
+            width = half * 4 // height
+        return cls(
+            panel_bytes_to_packed_bits(payload[:half]),
+            panel_bytes_to_packed_bits(payload[half:]),
+            width,
+            height,
+        )
+
+    # ------------------------------------------------------------------ conversions
+    def to_tuple(self):
+        """Legacy (red, green) tuple of height × width lists of 0/1."""
+        return (
+            _unpack_rows(self.red, self.width, self.height),
+            _unpack_rows(self.green, self.width, self.height),
+        )
+
+    def to_payload(self):
+        """Panel payload (red + green, 0011xxxx bytes) as used in image packets."""
+        red = packed_bits_to_bytes(self.red)
+        if self.green is self.red:
+            return red + red   # yellow: both channels share their bits
+        return red + packed_bits_to_bytes(self.green)
+
+    # ------------------------------------------------------------------ transforms
+    @property
+    def is_blank(self):
+        """True if no pixel of either channel is lit."""
+        return self.red.count(0) == len(self.red) and self.green.count(0) == len(self.green)
+
+    def ink_span(self):
+        """(first, last) lit column over both channels, None for a blank frame."""
+        stride = (self.width + 7) // 8
+        occupied = 0
+        for channel in (self.red, self.green):
+            for i in range(0, len(channel), stride):
+                occupied |= int.from_bytes(channel[i:i + stride], "big")
+        if not occupied:
+            return None
+        first = stride * 8 - occupied.bit_length()
+        last = stride * 8 - (occupied & -occupied).bit_length()
+        return first, last
+
+    def inverted(self, red=True, green=True):
+        """Copy with the chosen channels inverted (XOR with the column mask)."""
+        mask = _column_mask(self.width, self.height, 0, self.width)
+        size = len(self.red)
+
+        def flip(data):
+            return (int.from_bytes(data, "big") ^ mask).to_bytes(size, "big")
+
+        new_red = flip(self.red) if red else self.red
+        if self.green is self.red and green == red:
+            new_green = new_red   # keep shared channels shared
+        else:
+            new_green = flip(self.green) if green else self.green
+        return Frame(new_red, new_green, self.width, self.height)
+
+    def shifted(self, dx):
+        """Copy moved dx columns right (negative: left); vacated columns are blank."""
+        if not dx:
+            return self
+        red = _shift_channel(self.red, self.width, self.height, dx)
+        if self.green is self.red:
+            green = red
+        else:
+            green = _shift_channel(self.green, self.width, self.height, dx)
+        return Frame(red, green, self.width, self.height)
+
+    def centered(self):
+        """Copy with the lit columns centered horizontally (left margin rounded down)."""
+        span = self.ink_span()
+        if span is None:
+            return self
+        first, last = span
+        return self.shifted((self.width - (last - first + 1)) // 2 - first)
+
+    def padded(self, width, left=0):
+        """
+        Copy widened (or cropped) to width columns, with this frame's column 0
+        placed at column left of the result.
+        """
+        stride = (self.width + 7) // 8
+        new_stride = (width + 7) // 8
+
+        def pad(data):
+            rows = []
+            for i in range(0, len(data), stride):
+                row = int.from_bytes(data[i:i + stride], "big") >> (stride * 8 - self.width)
+                shift = new_stride * 8 - left - self.width
+                row = row << shift if shift >= 0 else row >> -shift
+                rows.append(row)
+            mask = _column_mask(width, 1, 0, width)
+            return b"".join((row & mask).to_bytes(new_stride, "big") for row in rows)
+
+        return Frame(pad(self.red), pad(self.green), width, self.height)
+
+    # ------------------------------------------------------------------ value semantics
+    def __eq__(self, other):
+        if not isinstance(other, Frame):
+            return NotImplemented
+        return (
+            self.width == other.width
+            and self.height == other.height
+            and self.red == other.red
+            and self.green == other.green
+        )
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.width, self.height, self.red, self.green))
+        return self._hash
+
+    def __repr__(self):
+        lit = sum(bin(b).count("1") for b in self.red + self.green)
+        return f"<Frame {self.width}×{self.height}, {lit} lit>"
+
+    def __getstate__(self):
+        return (self.red, self.green, self.width, self.height)
+
+    def __setstate__(self, state):
+        self.red, self.green, self.width, self.height = state
+        self._hash = None
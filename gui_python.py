@@ -1,11 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from tkinter import scrolledtext
-import time
+import queue
 import serial
 import serial.tools.list_ports
 
-import constants
 from comm_library import (
     commands_set_text,
     commands_show_custom_imgs,
@@ -13,7 +12,10 @@ from comm_library import (
     commands_set_width,
     commands_clear_memory,
 )
-from text_to_frames import generate_led_frames
+from text_to_frames import generate_led_frames, FONTS
+from panel_profile import PanelProfile
+from render_cache import RenderCache
+from panel_session import PanelSession, SendWorker
 
 
 class SigmaPanelApp(tk.Tk):
@@ -30,6 +32,21 @@ class SigmaPanelApp(tk.Tk):
         if self.ports:
             self.port_var.set(self.ports[0])
 
+        # rendered frames of recently sent messages
+        self.render_cache = RenderCache()
+
+        # size of the connected panel, passed to rendering and command building
+        self.profile = PanelProfile()
+
+        # serial connection, opened on first send and kept open
+        self.session = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # serial I/O runs on a worker thread; its events come back through _ui_events
+        self.worker = SendWorker()
+        self._ui_events = queue.Queue()
+        self.status_var = tk.StringVar(value="Idle")
+
         # --- token groups for text editor ---
         # All tokens supported by commands_set_text
         self.token_groups = {
@@ -163,6 +180,7 @@ class SigmaPanelApp(tk.Tk):
         self._build_log_frame()
 
         self.after(100, lambda: self.log("Log initialized, application running.\n"))
+        self.after(50, self._poll_worker)
 
     # ------------------------------------------------------------------ UI builders
     def _build_connection_frame(self):
@@ -190,6 +208,13 @@ class SigmaPanelApp(tk.Tk):
 
         ttk.Label(frame, text="(default 9600)").grid(row=0, column=4, padx=5, pady=5, sticky="w")
 
+        ttk.Button(
+            frame,
+            text="Cancel sending",
+            command=self.on_cancel_send,
+        ).grid(row=0, column=6, padx=5, pady=5, sticky="w")
+        ttk.Label(frame, textvariable=self.status_var).grid(row=0, column=7, padx=5, pady=5, sticky="w")
+
     def _build_control_frame(self):
         frame = ttk.LabelFrame(self, text="Panel commands")
         frame.pack(fill="x", padx=10, pady=5)
@@ -202,7 +227,7 @@ class SigmaPanelApp(tk.Tk):
         ).grid(row=0, column=0, padx=5, pady=5, sticky="w")
 
         # Width selector + button
-        self.width_var = tk.IntVar(value=constants.IMG_W)
+        self.width_var = tk.IntVar(value=self.profile.width)
         ttk.Label(frame, text="Width:").grid(row=0, column=1, padx=5, pady=5, sticky="e")
         ttk.Radiobutton(frame, text="128 px", variable=self.width_var, value=128).grid(
             row=0, column=2, padx=2, pady=5
@@ -389,7 +414,12 @@ class SigmaPanelApp(tk.Tk):
         self.log_widget.see("end")
         self.log_widget.configure(state="normal")
 
-    def _open_serial(self):
+    def _get_session(self):
+        """
+        Return the PanelSession for the selected port/baudrate. The port is
+        opened by the worker on first send and kept open between batches;
+        changing port or baudrate starts a new session.
+        """
         port = self.port_var.get().strip()
         if not port:
             raise RuntimeError("Serial port is empty.")
@@ -398,58 +428,85 @@ class SigmaPanelApp(tk.Tk):
         except ValueError:
             raise RuntimeError("Baudrate must be an integer.")
 
-        try:
-            ser = serial.Serial(port=port, baudrate=baud, timeout=3)
-        except Exception as e:
-            raise RuntimeError(f"Cannot open port {port}: {e}")
-        return ser
+        if self.session is not None and not self.session.matches(port, baud):
+            old = self.session
+            self.worker.submit(old, [], on_done=lambda job: old.close())
+            self.session = None
+        if self.session is None:
+            self.session = PanelSession(port, baudrate=baud)
+        return self.session
 
-    def send_commands(self, commands):
+    def send_commands(self, commands, label="commands", total=None):
         """
-        Send list of bytes commands over serial and log the communication.
+        Queue bytes commands (a list or a lazy iterable with its total) for the
+        send worker. Progress and replies are logged as they come in; the UI
+        stays responsive meanwhile.
         """
         try:
-            ser = self._open_serial()
+            session = self._get_session()
         except RuntimeError as e:
             messagebox.showerror("Serial error", str(e))
             return
 
-        self.log(f"\n=== Sending {len(commands)} command(s) ===\n")
-        self.log(f"Port: {ser.port}, baudrate: {ser.baudrate}\n")
-
-        for i, cmd in enumerate(commands, start=1):
-            if isinstance(cmd, str):
-                data = cmd.encode("ascii")
-            else:
-                data = cmd
-
-            try:
-                ser.write(data)
-            except Exception as e:
-                self.log(f"Error sending command {i}: {e}\n")
-                break
-
-            self.log(f"[{i}] Sent ({len(data)} bytes): {data.hex(' ')}\n")
-
-            # wait briefly & try to read answer (if any)
-            time.sleep(0.1)
-            try:
-                resp = ser.readline()
-            except Exception as e:
-                self.log(f"Read error: {e}\n")
-                break
-
-            if resp:
-                try:
-                    text = resp.decode(errors="ignore").strip()
-                except Exception:
-                    text = repr(resp)
-                self.log(f"    Received: {text}\n")
-            else:
-                self.log("    No response (timeout)\n")
+        if total is None:
+            total = len(commands)
+        self.log(f"\n=== Queued {label}: {total} command(s) ===\n")
+        self.worker.submit(
+            session,
+            commands,
+            label=label,
+            # streamed packets reuse one buffer → copy before handing to the Tk thread
+            on_progress=lambda job, i, cmd, resp: self._ui_events.put(("progress", job, i, bytes(cmd), resp)),
+            on_done=lambda job: self._ui_events.put(("done", job)),
+            total=total,
+        )
+        self._update_status()
 
-        ser.close()
-        self.log("=== Done, port closed ===\n")
+    def _poll_worker(self):
+        """Apply worker events on the Tk thread (rescheduled with after())."""
+        try:
+            while True:
+                event = self._ui_events.get_nowait()
+                if event[0] == "progress":
+                    self._on_send_progress(*event[1:])
+                else:
+                    self._on_send_done(event[1])
+        except queue.Empty:
+            pass
+        self._update_status()
+        self.after(50, self._poll_worker)
+
+    def _on_send_progress(self, job, index, data, resp):
+        if index == 0:
+            self.log(f"--- Sending {job.label} to {job.session.port} @ {job.session.baudrate} ---\n")
+        self.log(f"[{index + 1}] Sent ({len(data)} bytes): {data.hex(' ')}\n")
+
+        if resp is None:
+            return  # panel does not answer this command
+        if resp:
+            text = resp.decode(errors="ignore").strip()
+            self.log(f"    Received: {text or resp.hex(' ')}\n")
+        else:
+            self.log("    No response (timeout)\n")
+
+    def _on_send_done(self, job):
+        if job.error is not None:
+            self.log(f"Error sending command {job.sent + job.skipped + 1}: {job.error}\n")
+        elif job.cancelled:
+            self.log(f"=== {job.label} cancelled after {job.sent + job.skipped}/{job.total} command(s) ===\n")
+        elif job.total:
+            skipped = f", {job.skipped} unchanged frame(s) skipped" if job.skipped else ""
+            self.log(f"=== Done {job.label} in {job.elapsed:.2f} s{skipped} ===\n")
+
+    def _update_status(self):
+        job = self.worker.current
+        if job is None:
+            self.status_var.set("Idle")
+            return
+        status = f"Sending {job.label}: {job.sent + job.skipped}/{job.total}"
+        if self.worker.pending:
+            status += f", {self.worker.pending} queued"
+        self.status_var.set(status)
 
     def insert_token(self, token: str):
         """
@@ -473,7 +530,7 @@ class SigmaPanelApp(tk.Tk):
         except Exception as e:
             messagebox.showerror("Error", f"Error building time/date command:\n{e}")
             return
-        self.send_commands(commands)
+        self.send_commands(commands, label="time & date")
 
     def on_set_width(self):
         width = self.width_var.get()
@@ -482,9 +539,9 @@ class SigmaPanelApp(tk.Tk):
             messagebox.showerror("Error", "Supported widths are 128 or 256 pixels.")
             return
 
-        # --- IMPORTANT: also update constants.IMG_W so all matrix conversions use the new width
-        constants.IMG_W = width
-        self.log(f"\nUpdated constants.IMG_W to {width}.\n")
+        # frames rendered from now on use the new width (queued sends keep theirs)
+        self.profile = self.profile.replace(width=width)
+        self.log(f"\nPanel profile: {self.profile}.\n")
 
         try:
             commands = commands_set_width(width)
@@ -492,7 +549,7 @@ class SigmaPanelApp(tk.Tk):
             messagebox.showerror("Error", f"Error building width command:\n{e}")
             return
 
-        self.send_commands(commands)
+        self.send_commands(commands, label="width")
 
     def on_clear_memory(self):
         try:
@@ -500,7 +557,7 @@ class SigmaPanelApp(tk.Tk):
         except Exception as e:
             messagebox.showerror("Error", f"Error building clear-memory command:\n{e}")
             return
-        self.send_commands(commands)
+        self.send_commands(commands, label="clear memory")
 
     def on_send_text(self):
         text = self.text_editor.get("1.0", "end-1c")
@@ -512,7 +569,7 @@ class SigmaPanelApp(tk.Tk):
         except Exception as e:
             messagebox.showerror("Error", f"Error building text command:\n{e}")
             return
-        self.send_commands(commands)
+        self.send_commands(commands, label="text")
 
     def on_browse_font(self):
         path = filedialog.askopenfilename(
@@ -535,6 +592,7 @@ class SigmaPanelApp(tk.Tk):
         color_name = self.color_var.get()
         invert = self.invert_var.get()
         font_path = self.font_path_var.get().strip() or None
+        profile = self.profile
 
         try:
             frames = generate_led_frames(
@@ -543,6 +601,9 @@ class SigmaPanelApp(tk.Tk):
                 color_name=color_name,
                 font_path=font_path,
                 invert=invert,
+                cache=self.render_cache,
+                renderer="atlas",
+                profile=profile,
             )
         except Exception as e:
             messagebox.showerror("Error", f"Error generating frames:\n{e}")
@@ -552,15 +613,31 @@ class SigmaPanelApp(tk.Tk):
             messagebox.showwarning("No frames", "No frames were generated.")
             return
 
+        _, used_font = FONTS.load(size_label, font_path)
         self.log(f"Generated {len(frames)} frame(s) for custom text.\n")
+        self.log(f"Font: {used_font or 'built-in default'}\n")
 
+        # repeated frames (e.g. blank pauses) are uploaded only once
         try:
-            commands = commands_show_custom_imgs(frames)
-        except Exception as e:
-            messagebox.showerror("Error", f"Error building custom image commands:\n{e}")
+            commands = commands_show_custom_imgs(frames, profile=profile)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Error building frame commands:\n{e}")
             return
-
-        self.send_commands(commands)
+        uploads = len(commands) - 2
+        if uploads < len(frames):
+            self.log(f"Uploading {uploads} distinct frame(s) of {len(frames)}.\n")
+        self.send_commands(commands, label="custom frames")
+
+    def on_cancel_send(self):
+        if self.worker.busy:
+            self.log("\nCancelling queued and in-flight sends...\n")
+        self.worker.cancel(pending=True)
+
+    def on_close(self):
+        self.worker.stop(timeout=2)
+        if self.session is not None:
+            self.session.close()
+        self.destroy()
 
     def refresh_ports(self):
         self.ports = [p.device for p in serial.tools.list_ports.comports()]
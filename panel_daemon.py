@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Headless panel daemon: owns the serial sessions and takes updates over a local API.
+
+    python -m panel_daemon --panel hall=/dev/ttyUSB0 --panel gate=COM4,width=256
+    python -m panel_daemon --panel hall=/dev/ttyUSB0 --socket /run/sigma-panel.sock
+
+HTTP/JSON API (localhost or Unix socket):
+
+    GET  /panels                      state of every panel
+    GET  /panels/<name>               state of one panel
+    POST /panels/<name>/text          {"text": "..."}
+    POST /panels/<name>/frames        {"text": "...", "size": "full", "color": "red",
+                                       "invert": false, "font_path": null,
+                                       "scroll": {"step": 4, "max_frames": 26}}   (scroll optional)
+    POST /panels/<name>/time          {"time": "HHMM", "date": "MMDDYY"}   (both optional → now)
+    POST /panels/<name>/clear         clear the panel memory
+
+Updates are queued per panel and coalesced: while one update is being
+transmitted, a newer one of the same kind (content = text / frames, time,
+clear) replaces the queued one, so a burst only sends its newest state.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from comm_library import commands_clear_memory, commands_set_text, commands_set_time_and_date
+from panel_profile import PanelProfile
+from panel_session import PanelSession, SendJob
+from text_to_frames import FONT_SIZES, generate_led_frames, iter_scroll_frames
+
+
+# update kind → coalescing key: a newer update replaces a queued one with the same key
+UPDATE_KEYS = {"text": "content", "frames": "content", "time": "time", "clear": "clear"}
+
+_update_ids = itertools.count(1)
+
+
+# ========================= UPDATES =====================================
+
+class PanelUpdate:
+    """One queued change for a panel; build() returns the commands to send."""
+
+    __slots__ = ("id", "kind", "params", "received", "started", "finished", "ok", "error",
+                 "sent", "skipped", "_done")
+
+    def __init__(self, kind, params):
+        if kind not in UPDATE_KEYS:
+            raise ValueError("Update kind must be: " + " / ".join(UPDATE_KEYS))
+        self.id = next(_update_ids)
+        self.kind = kind
+        self.params = params
+        self.received = time.time()
+        self.started = None
+        self.finished = None
+        self.ok = None              # None → queued / replaced, True / False → sent / failed
+        self.error = None
+        self.sent = 0
+        self.skipped = 0
+        self._done = threading.Event()
+
+    @property
+    def key(self):
+        return UPDATE_KEYS[self.kind]
+
+    def wait(self, timeout=None):
+        """Wait until the update was sent, failed or got replaced."""
+        return self._done.wait(timeout)
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "ok": self.ok,
+            "error": self.error,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "elapsed": None if self.started is None or self.finished is None
+            else round(self.finished - self.started, 3),
+        }
+
+
+def _check_params(kind, params):
+    """Cheap validation at submit time, so bad requests fail with 400."""
+    if not isinstance(params, dict):
+        raise ValueError("Request body must be a JSON object")
+    if kind == "text":
+        if not isinstance(params.get("text"), str):
+            raise ValueError('"text" (string) is required')
+        commands_set_text(params["text"])  # Latin-1 / token errors surface now
+    elif kind == "frames":
+        if not isinstance(params.get("text"), str):
+            raise ValueError('"text" (string) is required')
+        if params.get("size", "full") not in FONT_SIZES:
+            raise ValueError("Font size must be: small / medium / full")
+        if params.get("color", "red") not in ("red", "green", "yellow"):
+            raise ValueError("Color must be red/green/yellow")
+        if not isinstance(params.get("invert", False), bool):
+            raise ValueError('"invert" must be true or false')
+        if not isinstance(params.get("font_path"), (str, type(None))):
+            raise ValueError('"font_path" must be a string or null')
+        scroll = params.get("scroll")
+        if scroll is not None:
+            if not isinstance(scroll, dict):
+                raise ValueError('"scroll" must be an object')
+            for field in ("step", "max_frames"):
+                value = scroll.get(field, 1)
+                # bool is an int too, but {"step": true} is a client bug
+                if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                    raise ValueError(f'"scroll.{field}" must be an integer ≥ 1')
+    elif kind == "time":
+        for field, digits in (("time", (4, 6)), ("date", (6,))):
+            value = params.get(field)
+            if value is not None and not (isinstance(value, str) and value.isdigit()
+                                          and len(value) in digits):
+                raise ValueError(f'"{field}" must be {" or ".join(map(str, digits))} digits')
+
+
+# ========================= PANEL CHANNEL ===============================
+
+class PanelChannel:
+    """
+    One panel: its PanelSession and a thread sending queued updates in
+    order of arrival, with newer updates replacing queued ones of the same
+    kind (see UPDATE_KEYS).
+    """
+
+    def __init__(self, name, session):
+        self.name = name
+        self.session = session
+        self.profile = session.profile
+
+        self.received = 0
+        self.coalesced = 0      # updates replaced before they were sent
+        self.failed = 0
+        self.current = None
+        self.last = None
+
+        self._pending = OrderedDict()   # key → newest PanelUpdate, oldest first
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=f"panel-{name}", daemon=True)
+
+    # ------------------------------------------------------------------ lifecycle
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            replaced = list(self._pending.values())
+            self._pending.clear()
+            self._cond.notify_all()
+        for update in replaced:
+            update._done.set()
+        self._thread.join(timeout)
+        self.session.close()
+
+    # ------------------------------------------------------------------ queue
+    def submit(self, update):
+        """Queue update; a queued update with the same key is dropped."""
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError(f"Panel {self.name} is shutting down")
+            self.received += 1
+            old = self._pending.pop(update.key, None)
+            if old is not None:
+                self.coalesced += 1
+                old._done.set()
+            self._pending[update.key] = update
+            self._cond.notify()
+        return update
+
+    @property
+    def pending(self):
+        with self._cond:
+            return [u.kind for u in self._pending.values()]
+
+    def state(self):
+        current = self.current
+        last = self.last
+        return {
+            "name": self.name,
+            "port": self.session.port,
+            "baudrate": self.session.baudrate,
+            "width": self.profile.width,
+            "connected": self.session.is_open,
+            "sending": None if current is None else current.as_dict(),
+            "pending": self.pending,
+            "last": None if last is None else last.as_dict(),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }
+
+    # ------------------------------------------------------------------ sending
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                _, update = self._pending.popitem(last=False)
+                self.current = update
+            try:
+                self._send(update)
+            finally:
+                self.current = None
+                self.last = update
+                update._done.set()
+
+    def _send(self, update):
+        update.started = time.perf_counter()
+        try:
+            commands = self._build(update)
+            job = SendJob(self.session, commands, label=update.kind)
+            job.run()
+            update.sent, update.skipped = job.sent, job.skipped
+            if job.error is not None:
+                raise job.error
+            update.ok = True
+        except Exception as e:  # report, keep serving the other updates
+            update.ok = False
+            update.error = str(e)
+            self.failed += 1
+            if update.kind == "frames":
+                self.session.forget_frames()   # unknown what the panel stored
+        finally:
+            update.finished = time.perf_counter()
+
+    def _build(self, update):
+        """Commands for update, rendered only now (replaced updates never render)."""
+        p = update.params
+        if update.kind == "text":
+            return commands_set_text(p["text"])
+        if update.kind == "time":
+            return commands_set_time_and_date(p.get("time"), p.get("date"))
+        if update.kind == "clear":
+            return commands_clear_memory()
+
+        render = dict(
+            text=p["text"],
+            size_label=p.get("size", "full"),
+            color_name=p.get("color", "red"),
+            font_path=p.get("font_path"),
+            invert=p.get("invert", False),
+            packed=True,
+            profile=self.profile,
+        )
+        scroll = p.get("scroll")
+        if scroll is not None:
+            frames = list(iter_scroll_frames(
+                step=scroll.get("step", 1),
+                max_frames=scroll.get("max_frames", len(self.profile.slot_labels)),
+                **render,
+            ))
+        else:
+            frames = generate_led_frames(renderer="atlas", **render)
+        # frames the panel already stores for earlier messages are not resent;
+        # the port is opened first, as opening forgets what the slots hold
+        self.session.open()
+        return self.session.slots.commands(frames)
+
+
+# ========================= DAEMON ======================================
+
+class PanelDaemon:
+    """The panels served by one daemon process, by name."""
+
+    def __init__(self, sessions):
+        self.channels = {name: PanelChannel(name, s) for name, s in sessions.items()}
+
+    def start(self):
+        for channel in self.channels.values():
+            channel.start()
+        return self
+
+    def stop(self, timeout=None):
+        for channel in self.channels.values():
+            channel.stop(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def channel(self, name):
+        try:
+            return self.channels[name]
+        except KeyError:
+            raise KeyError(f"Unknown panel {name!r}")
+
+    def submit(self, name, kind, params=None):
+        """Validate and queue an update for panel name → PanelUpdate."""
+        channel = self.channel(name)
+        params = {} if params is None else params
+        _check_params(kind, params)
+        return channel.submit(PanelUpdate(kind, params))
+
+    def state(self):
+        return [channel.state() for channel in self.channels.values()]
+
+
+# ========================= HTTP API ====================================
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "SigmaPanelDaemon/1.0"
+    daemon = None   # set on the server-specific subclass
+
+    def do_GET(self):
+        parts = self._parts()
+        if parts == ["panels"]:
+            return self._reply(200, {"panels": self.daemon.state()})
+        if len(parts) == 2 and parts[0] == "panels":
+            try:
+                return self._reply(200, self.daemon.channel(parts[1]).state())
+            except KeyError as e:
+                return self._reply(404, {"error": e.args[0]})
+        self._reply(404, {"error": "Not found"})
+
+    def do_POST(self):
+        parts = self._parts()
+        if len(parts) != 3 or parts[0] != "panels":
+            return self._reply(404, {"error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            params = json.loads(body.decode("utf-8")) if body.strip() else {}
+        except (ValueError, UnicodeDecodeError):
+            return self._reply(400, {"error": "Request body must be JSON"})
+        try:
+            update = self.daemon.submit(parts[1], parts[2], params)
+        except KeyError as e:
+            return self._reply(404, {"error": e.args[0]})
+        except (ValueError, RuntimeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(202, {"panel": parts[1], "update": update.id, "kind": update.kind})
+
+    def _parts(self):
+        return [p for p in self.path.split("?", 1)[0].split("/") if p]
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)   # stale socket of a previous run
+        super().server_bind()
+
+
+def make_server(daemon, host="127.0.0.1", port=8434, unix_socket=None, verbose=False):
+    """HTTP server for daemon on host:port, or on a Unix socket path."""
+    handler = type("Handler", (_Handler,), {"daemon": daemon})
+    if unix_socket:
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise RuntimeError("Unix sockets are not supported on this system.")
+        server = _UnixHTTPServer(unix_socket, handler)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+    server.verbose = verbose
+    return server
+
+
+# ========================= CLI =========================================
+
+def parse_panel(spec, baudrate=9600, width=None):
+    """"name=port[,baud=9600][,width=128]" → (name, PanelSession)."""
+    name, sep, rest = spec.partition("=")
+    if not sep or not name or not rest:
+        raise ValueError(f"Panel must be name=port[,baud=...][,width=...], got {spec!r}")
+    port, *options = rest.split(",")
+    for option in options:
+        key, sep, value = option.partition("=")
+        if key == "baud" and sep:
+            baudrate = int(value)
+        elif key == "width" and sep:
+            width = int(value)
+        else:
+            raise ValueError(f"Unknown panel option {option!r}")
+    profile = PanelProfile(width, baudrate=baudrate)
+    return name, PanelSession(port, profile=profile)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m panel_daemon", description=__doc__.splitlines()[1])
+    parser.add_argument("--panel", action="append", default=[], required=True,
+                        metavar="NAME=PORT[,baud=N][,width=N]", help="panel to serve (repeatable)")
+    parser.add_argument("--baud", type=int, default=9600, help="default baud rate (default 9600)")
+    parser.add_argument("--width", type=int, default=None, help="default panel width (default IMG_W)")
+    parser.add_argument("--host", default="127.0.0.1", help="HTTP address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8434, help="HTTP port (default 8434)")
+    parser.add_argument("--socket", metavar="PATH", help="serve on this Unix socket instead of HTTP")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    try:
+        sessions = dict(parse_panel(spec, args.baud, args.width) for spec in args.panel)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with PanelDaemon(sessions) as daemon:
+        server = make_server(daemon, args.host, args.port, args.socket, args.verbose)
+        where = args.socket or f"http://{args.host}:{args.port}"
+        print(f"Serving {', '.join(sessions)} on {where} (Ctrl+C to stop)", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if args.socket and os.path.exists(args.socket):
+                os.unlink(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
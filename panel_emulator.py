@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Pseudo-terminal emulator of an ASC 434 panel, for testing without hardware.
+
+    python -m panel_emulator --baud 9600 --latency 0.05
+
+prints the device to connect to (e.g. /dev/pts/3) and every decoded command.
+From code:
+
+    with PanelEmulator(baudrate=9600) as panel:
+        with PanelSession(panel.port) as session:
+            session.send(commands_show_custom_imgs(frames))
+        print(panel.state.playlist, sorted(panel.state.slots))
+
+POSIX only (uses os.openpty).
+"""
+
+import argparse
+import os
+import re
+import select
+import threading
+import time
+
+import constants
+from comm_library import bytes_to_frame
+
+
+# ========================= PANEL STATE =================================
+
+IMAGE_SIZES = {b"2@": 128, b"2P": 256}   # image packet size code → width
+WIDTH_CODES = {0x10: 128, 0x20: 256}     # byte 3 of the set width command
+
+_PLAYLIST_ENTRY = re.compile(rb"\]\?P(.)", re.DOTALL)
+
+
+class PanelState:
+    """Decoded content of the emulated panel."""
+
+    def __init__(self):
+        self.width = constants.IMG_W
+        self.texts = {}         # text file label → raw content
+        self.playlist = []      # slots the "Z" text file shows, in order
+        self.slots = {}         # slot label → frame payload (red + green)
+        self.date = None        # "MMDDYY"
+        self.time = None        # "HHMM" / "HHMMSS"
+        self.clears = 0
+        self.uploads = 0        # image packets received
+        self.confirmations = 0
+        self.unknown = 0        # frames with an unsupported command type
+        self.bytes_received = 0
+
+    @property
+    def text(self):
+        """Content of the "Z" text file (the one the library writes)."""
+        return self.texts.get("Z", b"")
+
+    def frame(self, slot):
+        """(red, green) matrices stored in slot."""
+        payload = self.slots[slot]
+        width = len(payload) * 2 // constants.IMG_H
+        return bytes_to_frame(payload, width)
+
+    def clear(self):
+        self.texts.clear()
+        self.playlist = []
+        self.slots.clear()
+
+
+# ========================= EMULATOR ====================================
+
+class PanelEmulator:
+    """
+    Opens a pty and answers like a panel on the other end:
+
+    - bytes are consumed at baudrate (bits_per_byte per byte, 8N1 → 10),
+      so upload times match the real serial link,
+    - frames WRITE_START … WRITE_END are decoded into state (text files,
+      S<slot> images, E time/date, X clear memory, Y set width),
+    - the CONFIRMATION request is answered with reply after latency seconds
+      (reply=None → never answer).
+
+    The pty buffers ~20 KB, so writes return before the panel has "received"
+    them; the reply to CONFIRMATION only comes once everything sent before it
+    has been consumed, as on a real link.
+    """
+
+    def __init__(self, baudrate=9600, latency=0.0, reply=constants.CONFIRMATION,
+                 bits_per_byte=10, on_command=None):
+        if not hasattr(os, "openpty"):
+            raise RuntimeError("The panel emulator needs a POSIX system (os.openpty).")
+        if baudrate <= 0:
+            raise ValueError("baudrate must be positive")
+        self.baudrate = baudrate
+        self.latency = latency
+        self.reply = reply
+        self.bits_per_byte = bits_per_byte
+        self.on_command = on_command    # on_command(kind, detail), from the emulator thread
+
+        self.state = PanelState()
+        self.lock = threading.Lock()    # hold while reading state from other threads
+
+        self.port = None
+        self._master = self._slave = None
+        self._buffer = bytearray()
+        self._thread = None
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+
+    # ------------------------------------------------------------------ lifecycle
+    def start(self):
+        import tty
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)   # no echo, no line editing, binary safe
+        self.port = os.ttyname(self._slave)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="panel-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def wait_idle(self, timeout=None):
+        """Wait until every byte written so far has been consumed and decoded."""
+        self._idle.clear()
+        return self._idle.wait(timeout)
+
+    # ------------------------------------------------------------------ receiving
+    def _run(self):
+        byte_time = self.bits_per_byte / self.baudrate
+        chunk = max(1, int(0.01 / byte_time))  # ~10 ms of line time per read
+        line_free = time.perf_counter()
+
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.02)
+            if not ready:
+                self._idle.set()
+                continue
+            try:
+                data = os.read(self._master, chunk)
+            except OSError:
+                break
+            if not data:
+                continue
+
+            # the bytes were on the wire for len(data) byte times
+            line_free = max(line_free, time.perf_counter()) + len(data) * byte_time
+            delay = line_free - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._feed(data)
+
+    def _feed(self, data):
+        buf = self._buffer
+        buf.extend(data)
+        with self.lock:
+            self.state.bytes_received += len(data)
+
+        start = constants.WRITE_START
+        while True:
+            i = buf.find(start)
+            if i < 0:
+                del buf[:max(0, len(buf) - len(start) + 1)]  # keep a partial start
+                return
+            body_at = i + len(start) + 1
+            if len(buf) < body_at:
+                del buf[:i]
+                return
+            kind = chr(buf[body_at - 1])
+            # text, image and time frames end with ]$]$, clear / width with ]$
+            end = constants.WRITE_END if kind in "ASE" else constants.WRITE_END[:2]
+            j = buf.find(end, body_at)
+            if j < 0:
+                del buf[:i]
+                return
+            body = bytes(buf[body_at:j])
+            del buf[:j + len(end)]
+            self._handle(kind, body)
+
+    def _handle(self, kind, body):
+        state = self.state
+        reply = False
+        with self.lock:
+            if kind == "A" and body:
+                label = chr(body[0])
+                state.texts[label] = body[1:]
+                if label == "Z":
+                    state.playlist = [m.decode("latin-1") for m in _PLAYLIST_ENTRY.findall(body)]
+                detail = f"text {label}: {len(body) - 1} bytes"
+            elif kind == "S" and len(body) >= 3:
+                slot = chr(body[0])
+                width = IMAGE_SIZES.get(body[1:3])
+                payload = body[3:]
+                if width is None or len(payload) != constants.IMG_H * width // 2:
+                    state.unknown += 1
+                    detail = f"bad image packet for slot {slot} ({len(payload)} bytes)"
+                else:
+                    state.slots[slot] = payload
+                    state.uploads += 1
+                    detail = f"image slot {slot}"
+            elif kind == "E" and body[:1] == b";":
+                state.date = body[1:].decode("latin-1")
+                detail = f"date {state.date}"
+            elif kind == "E" and body[:1] == b" ":
+                state.time = body[1:].decode("latin-1")
+                detail = f"time {state.time}"
+            elif kind == "E" and body[:1] == b".":
+                state.confirmations += 1
+                reply = self.reply is not None
+                detail = "confirmation request"
+            elif kind == "X":
+                state.clear()
+                state.clears += 1
+                detail = "clear memory"
+            elif kind == "Y" and len(body) >= 3 and body[2] in WIDTH_CODES:
+                state.width = WIDTH_CODES[body[2]]
+                state.clear()
+                detail = f"width {state.width}"
+            else:
+                state.unknown += 1
+                detail = f"unknown {kind!r}: {body[:16]!r}"
+
+        if self.on_command is not None:
+            self.on_command(kind, detail)
+        if reply:
+            if self.latency:
+                time.sleep(self.latency)
+            os.write(self._master, self.reply)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m panel_emulator", description=__doc__.splitlines()[1])
+    parser.add_argument("--baud", type=int, default=9600, help="simulated baud rate (default 9600)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds before answering a confirmation request")
+    args = parser.parse_args(argv)
+
+    def show(kind, detail):
+        print(f"{time.strftime('%H:%M:%S')}  {detail}", flush=True)
+
+    with PanelEmulator(args.baud, args.latency, on_command=show) as panel:
+        print(f"Emulated panel on {panel.port} at {args.baud} bps (Ctrl+C to stop)", flush=True)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        s = panel.state
+        print(f"\nwidth {s.width}, slots {sorted(s.slots)}, playlist {s.playlist}, "
+              f"{s.bytes_received} bytes received")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import constants
+
+
+# ========================= PANEL PROFILE ===============================
+
+class PanelProfile:
+    """
+    Display geometry and link settings of one panel: frame width and height
+    in pixels, the frame slot labels it accepts and its baud rate.
+
+    Rendering and command building take a profile argument instead of reading
+    constants.IMG_W, so frames for 128 px and 256 px panels can be built at
+    the same time from different threads. Immutable; profile=None everywhere
+    means default_profile(), i.e. the values in constants.py.
+    """
+
+    __slots__ = ("width", "height", "slot_labels", "baudrate")
+
+    WIDTHS = (128, 256)   # widths the panel can be switched to (commands_set_width)
+
+    def __init__(self, width=None, height=None, slot_labels=None, baudrate=9600):
+        width = constants.IMG_W if width is None else int(width)
+        height = constants.IMG_H if height is None else int(height)
+        slot_labels = constants.SLOT_LABELS if slot_labels is None else str(slot_labels)
+        if width not in self.WIDTHS:
+            raise ValueError("Supported widths are 128 and 256px")
+        if height <= 0:
+            raise ValueError("Panel height must be positive")
+        if not slot_labels or len(set(slot_labels)) != len(slot_labels):
+            raise ValueError("Slot labels must be distinct characters")
+        object.__setattr__(self, "width", width)
+        object.__setattr__(self, "height", height)
+        object.__setattr__(self, "slot_labels", slot_labels)
+        object.__setattr__(self, "baudrate", int(baudrate))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PanelProfile is immutable, use replace()")
+
+    def replace(self, **changes):
+        """Copy with some fields changed, e.g. profile.replace(width=256)."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return PanelProfile(**fields)
+
+    # ------------------------------------------------------------------ frame sizes
+    @property
+    def row_bytes(self):
+        """Bytes per row of a packed 1-bit channel."""
+        return (self.width + 7) // 8
+
+    @property
+    def channel_bytes(self):
+        """Panel bytes (0011xxxx, 4 pixels each) of one color channel."""
+        return self.height * self.width // 4
+
+    @property
+    def payload_bytes(self):
+        """Bytes of one frame payload (red + green), 1024 at 16×128."""
+        return 2 * self.channel_bytes
+
+    # ------------------------------------------------------------------ value semantics
+    def _key(self):
+        return (self.width, self.height, self.slot_labels, self.baudrate)
+
+    def __eq__(self, other):
+        if not isinstance(other, PanelProfile):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        labels = self.slot_labels
+        return (f"PanelProfile({self.width}×{self.height}, slots {labels[0]}–{labels[-1]}, "
+                f"{self.baudrate} bps)")
+
+    def __reduce__(self):
+        return (PanelProfile, self._key())
+
+
+_default = None
+
+
+def default_profile():
+    """
+    Profile from constants.py. Built once and reused while IMG_W, IMG_H and
+    SLOT_LABELS stay the same, so code that still sets IMG_W is honoured.
+    """
+    global _default
+    default = _default
+    if (default is None
+            or default.width != constants.IMG_W
+            or default.height != constants.IMG_H
+            or default.slot_labels != constants.SLOT_LABELS):
+        default = _default = PanelProfile()
+    return default
+
+
+def resolve_profile(profile):
+    """profile, or default_profile() for None."""
+    return default_profile() if profile is None else profile
+
+
+PROFILE_128 = PanelProfile(128, 16)
+PROFILE_256 = PanelProfile(256, 16)
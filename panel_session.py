@@ -0,0 +1,534 @@
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+
+import constants
+from comm_library import SlotAllocator, image_packet_slot, resets_frame_memory
+from panel_profile import resolve_profile
+
+
+# Commands the panel answers; everything else is written without waiting.
+REPLY_COMMANDS = (constants.CONFIRMATION,)
+
+# A reply ends at the first of these (or when the line goes quiet).
+REPLY_TERMINATORS = (b"\r", b"\n", constants.WRITE_END)
+
+
+def reply_ok(reply):
+    """True for a complete answer: not empty and ending in a reply terminator."""
+    return bool(reply) and reply.endswith(REPLY_TERMINATORS)
+
+
+# ========================= PANEL SESSION ===============================
+
+class PanelSession:
+    """
+    Serial connection to one panel, kept open across command batches.
+
+    Opening a USB-serial adapter is slow (and resets some adapters), so the
+    port is opened lazily on first use and then reused. A write that fails
+    because the adapter went away closes the port, reopens it and retries
+    once. Usable as a context manager and safe to share between threads.
+
+    port can be a device name (COM4, /dev/ttyUSB0) or any pyserial URL
+    (e.g. "loop://" for a loopback without hardware).
+
+    Pacing is driven by the panel's replies: commands in reply_commands wait
+    for an answer (returned as soon as a terminator arrives, or after
+    reply_timeout seconds of silence), all others are just written.
+
+    With skip_unchanged the session remembers a hash of the last image packet
+    written to each frame slot and leaves out packets the panel already holds.
+    Hashes only count once a later reply command was answered properly
+    (reply_ok); a missing or garbled reply forgets every frame.
+    The record is dropped whenever the port is (re)opened and after clear
+    memory / set width commands, so the next upload is a full one.
+    show_frames() goes further and lets messages share stored frames.
+
+    profile (panel_profile.PanelProfile) describes the panel on the other
+    end: its baud rate is the default for baudrate, its width and slot labels
+    are used by show_frames().
+    """
+
+    def __init__(self, port, baudrate=None, reply_timeout=0.5, reply_commands=REPLY_COMMANDS,
+                 skip_unchanged=True, profile=None):
+        if not port:
+            raise ValueError("Serial port is empty.")
+        if reply_timeout <= 0:
+            raise ValueError("reply_timeout must be positive")
+        self.profile = resolve_profile(profile)
+        self.port = port
+        self.baudrate = int(self.profile.baudrate if baudrate is None else baudrate)
+        self.reply_timeout = reply_timeout
+        self.reply_commands = tuple(reply_commands)
+        self.skip_unchanged = skip_unchanged
+
+        self.frame_hashes = {}  # slot label → hash of the packet the panel holds
+        self._unconfirmed = {}  # slot label → hash written since the last good reply
+        self.slots = SlotAllocator(profile=self.profile)  # which frame show_frames() stored where
+        self.serial = None
+        self.opens = 0          # how many times the port was (re)opened
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------ lifecycle
+    def open(self):
+        """Open the port if it is not open yet. Returns the serial object."""
+        with self._lock:
+            if self.serial is not None and self.serial.is_open:
+                return self.serial
+            self._drop()
+            try:
+                self.serial = serial.serial_for_url(
+                    self.port, baudrate=self.baudrate, timeout=self.reply_timeout
+                )
+            except (serial.SerialException, OSError, ValueError) as e:
+                raise RuntimeError(f"Cannot open port {self.port}: {e}")
+            self.opens += 1
+            self.forget_frames()  # panel may have been reset meanwhile
+            return self.serial
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def reopen(self):
+        """Close and open the port again (e.g. after the adapter was replugged)."""
+        with self._lock:
+            self._drop()
+            return self.open()
+
+    @property
+    def is_open(self):
+        return self.serial is not None and self.serial.is_open
+
+    def matches(self, port, baudrate):
+        """True if this session talks to port at baudrate."""
+        return self.port == port and self.baudrate == int(baudrate)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ------------------------------------------------------------------ I/O
+    def write(self, data):
+        """Write bytes (or an ASCII str), reconnecting once on a lost port."""
+        if isinstance(data, str):
+            data = data.encode("ascii")
+        with self._lock:
+            try:
+                return self._write(data)
+            except (serial.SerialException, OSError):
+                self._drop()
+            try:
+                return self._write(data)
+            except (serial.SerialException, OSError) as e:
+                self._drop()
+                raise RuntimeError(f"Lost connection to {self.port}: {e}")
+
+    # ------------------------------------------------------------------ frame slots
+    def forget_frames(self):
+        """Force the next image upload to resend every slot."""
+        with self._lock:
+            self.frame_hashes.clear()
+            self._unconfirmed.clear()
+            self.slots.clear()
+
+    def show_frames(self, imgs):
+        """
+        Show imgs, uploading only frames no slot holds yet (see SlotAllocator);
+        content shown before comes back with just the header packet.
+        """
+        with self._lock:
+            # open first: opening forgets the slots, and with them this assignment
+            self.open()
+            try:
+                return self.send(self.slots.commands(imgs))
+            except RuntimeError:
+                self.forget_frames()  # unknown how much the panel got
+                raise
+
+    def holds_frame(self, cmd):
+        """True if cmd is an image packet whose slot already holds the same bytes."""
+        if not self.skip_unchanged:
+            return False
+        slot = image_packet_slot(cmd)
+        if slot is None:
+            return False
+        with self._lock:
+            return self.frame_hashes.get(slot) == _packet_hash(cmd)
+
+    def _note_sent(self, cmd):
+        if resets_frame_memory(cmd):
+            self.forget_frames()
+            return
+        slot = image_packet_slot(cmd)
+        if slot is not None:
+            # the slot's old content is gone; the new one only counts once
+            # the panel has confirmed it (see _note_reply)
+            self.frame_hashes.pop(slot, None)
+            self._unconfirmed[slot] = _packet_hash(cmd)
+
+    def _note_reply(self, reply):
+        """A reply arrived: keep the frames written before it, or forget them all."""
+        if reply_ok(reply):
+            self.frame_hashes.update(self._unconfirmed)
+            self._unconfirmed.clear()
+        else:
+            # timeout or garbled answer: the panel may not hold what we sent
+            self.forget_frames()
+
+    # ------------------------------------------------------------------ protocol
+    def expects_reply(self, cmd):
+        return cmd in self.reply_commands
+
+    def exchange(self, cmd):
+        """
+        Write one command and, if the panel answers it, read the reply.
+        Returns the reply bytes (b"" on timeout) or None when no reply is expected.
+        """
+        if isinstance(cmd, str):
+            cmd = cmd.encode("ascii")
+        with self._lock:
+            self._discard_input()  # late / unsolicited bytes, never a reply to cmd
+            self.write(cmd)
+            self._note_sent(cmd)
+            if not self.expects_reply(cmd):
+                return None
+            reply = self.read_reply()
+            self._note_reply(reply)
+            return reply
+
+    def send(self, commands):
+        """
+        Send a batch (minus unchanged image packets, see skip_unchanged);
+        returns the replies to the commands that expect one. commands may be
+        any iterable, e.g. comm_library.iter_show_custom_imgs(...), and is
+        consumed one command at a time.
+        """
+        with self._lock:
+            replies = []
+            for cmd in commands:
+                if self.holds_frame(cmd):
+                    continue
+                reply = self.exchange(cmd)
+                if reply is not None:
+                    replies.append(reply)
+            return replies
+
+    def read_reply(self, timeout=None):
+        """
+        Read one reply: returns as soon as a terminator arrives, or what was
+        received once the line stays quiet for timeout (default reply_timeout).
+        """
+        with self._lock:
+            ser = self.open()
+            if timeout is not None and timeout != ser.timeout:
+                ser.timeout = timeout
+            reply = bytearray()
+            try:
+                while True:
+                    chunk = ser.read(ser.in_waiting or 1)
+                    if not chunk:
+                        break
+                    reply.extend(chunk)
+                    if reply.endswith(REPLY_TERMINATORS):
+                        break
+            except (serial.SerialException, OSError) as e:
+                self._drop()
+                raise RuntimeError(f"Lost connection to {self.port}: {e}")
+            finally:
+                if self.serial is not None and ser.timeout != self.reply_timeout:
+                    ser.timeout = self.reply_timeout
+            return bytes(reply)
+
+    # ------------------------------------------------------------------ internals
+    def _write(self, data):
+        ser = self.open()
+        sent = ser.write(data)
+        ser.flush()
+        return sent
+
+    def _discard_input(self):
+        ser = self.open()
+        try:
+            if ser.in_waiting:
+                ser.reset_input_buffer()
+        except (serial.SerialException, OSError):
+            self._drop()
+
+    def _drop(self):
+        self.forget_frames()
+        ser, self.serial = self.serial, None
+        if ser is not None:
+            try:
+                ser.close()
+            except (serial.SerialException, OSError):
+                pass
+
+
+def _packet_hash(packet):
+    return hashlib.blake2b(packet, digest_size=16).digest()
+
+
+# ========================= SEND WORKER =================================
+
+class SendJob:
+    """
+    One batch of commands queued on a SendWorker.
+
+    commands may be a list or a lazy iterable (e.g. iter_show_custom_imgs),
+    which is only consumed while the job runs; pass total for progress then.
+    on_progress(job, index, cmd, reply) runs after every command written
+    (reply is None when the command has no answer), on_done(job) once at the
+    end. Both are called from the worker thread; streamed packets are only
+    valid during the callback.
+    """
+
+    def __init__(self, session, commands, label="", on_progress=None, on_done=None, total=None):
+        self.session = session
+        self.commands = commands
+        self.label = label
+        self.on_progress = on_progress
+        self.on_done = on_done
+        if total is None and hasattr(commands, "__len__"):
+            total = len(commands)
+        self.total = total
+
+        self.sent = 0
+        self.skipped = 0        # image packets left out because the panel had them
+        self.replies = []
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stop after the command currently being written."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self.finished is not None and self.error is None and not self.cancelled
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def run(self):
+        self.started = time.perf_counter()
+        commands = iter(self.commands)
+        try:
+            for i, cmd in enumerate(commands):
+                if self.cancelled:
+                    break
+                if self.session.holds_frame(cmd):
+                    self.skipped += 1
+                    continue
+                try:
+                    reply = self.session.exchange(cmd)
+                except Exception as e:
+                    self.error = e
+                    break
+                self.sent += 1
+                if reply is not None:
+                    self.replies.append(reply)
+                if self.on_progress is not None:
+                    self.on_progress(self, i, cmd, reply)
+        except Exception as e:  # a lazy command source failed (e.g. rendering)
+            self.error = e
+        finally:
+            close = getattr(commands, "close", None)
+            if close is not None:
+                close()
+            self.finished = time.perf_counter()
+
+
+class SendWorker:
+    """
+    Background thread that sends queued SendJobs one after another, so the
+    caller (e.g. the Tk mainloop) never blocks on serial I/O.
+    """
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._current = None
+        self._thread = threading.Thread(target=self._run, name="panel-send", daemon=True)
+        self._thread.start()
+
+    def submit(self, session, commands, label="", on_progress=None, on_done=None, total=None):
+        """Queue a batch (list or lazy iterable) for session; returns its SendJob."""
+        job = SendJob(session, commands, label, on_progress, on_done, total)
+        self._jobs.put(job)
+        return job
+
+    def cancel(self, pending=False):
+        """
+        Cancel the job in flight and, with pending=True, everything queued.
+        Cancelled queued jobs stay in the queue without sending anything, so
+        their on_done still runs on the worker thread.
+        """
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+        if pending:
+            jobs = []
+            while True:
+                try:
+                    jobs.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            for job in jobs:
+                if job is not None:   # None is the stop request, keep it in place
+                    job.cancel()
+                self._jobs.put(job)
+
+    @property
+    def current(self):
+        """The job being sent right now, or None."""
+        return self._current
+
+    @property
+    def pending(self):
+        """Number of jobs waiting behind the current one."""
+        return self._jobs.qsize()
+
+    @property
+    def busy(self):
+        return self._current is not None or not self._jobs.empty()
+
+    def stop(self, timeout=None):
+        """Cancel everything and let the thread finish."""
+        self.cancel(pending=True)
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            with self._lock:
+                self._current = job
+            try:
+                if job.cancelled:
+                    # cancelled while queued (see cancel): never started, only reported
+                    job.finished = time.perf_counter()
+                else:
+                    job.run()
+            except Exception as e:  # a failing callback must not kill the worker
+                job.error = e
+            finally:
+                with self._lock:
+                    self._current = None
+                if job.on_done is not None:
+                    job.on_done(job)
+
+
+# ========================= MULTI-PANEL FAN-OUT =========================
+
+class PanelResult:
+    """Outcome of sending one batch to one panel."""
+
+    __slots__ = ("port", "ok", "elapsed", "sent", "skipped", "replies", "error")
+
+    def __init__(self, port, ok, elapsed, sent, replies, error=None, skipped=0):
+        self.port = port
+        self.ok = ok
+        self.elapsed = elapsed
+        self.sent = sent
+        self.skipped = skipped
+        self.replies = replies
+        self.error = error
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"failed: {self.error}"
+        return (f"<PanelResult {self.port} {state}, {self.sent} cmd(s) "
+                f"({self.skipped} skipped) in {self.elapsed:.3f} s>")
+
+
+def _as_session(panel):
+    """PanelSession from a session, a port name, a (port, baudrate) tuple or a dict of kwargs."""
+    if isinstance(panel, PanelSession):
+        return panel, False
+    if isinstance(panel, str):
+        return PanelSession(panel), True
+    if isinstance(panel, dict):
+        return PanelSession(**panel), True
+    return PanelSession(*panel), True
+
+
+def _panel_name(panel):
+    """Port of a panel config for results, even when the config is broken."""
+    if isinstance(panel, PanelSession):
+        return panel.port
+    if isinstance(panel, str):
+        return panel
+    if isinstance(panel, dict):
+        return panel.get("port", repr(panel))
+    try:
+        return panel[0]
+    except (TypeError, IndexError, KeyError):
+        return repr(panel)
+
+
+def _send_one(panel, commands):
+    """Build the session for panel (a failure only fails this panel) and send."""
+    started = time.perf_counter()
+    try:
+        session, temporary = _as_session(panel)
+    except (TypeError, ValueError, RuntimeError) as e:
+        return PanelResult(_panel_name(panel), False, time.perf_counter() - started, 0, [],
+                           f"Invalid panel config: {e}")
+    try:
+        job = SendJob(session, commands)
+        job.run()
+    finally:
+        if temporary:
+            session.close()
+    return PanelResult(
+        session.port,
+        job.error is None,
+        job.elapsed,
+        job.sent,
+        job.replies,
+        None if job.error is None else str(job.error),
+        job.skipped,
+    )
+
+
+def send_to_panels(panels, commands, max_workers=None):
+    """
+    Send the same commands to many panels at once, one thread per serial link,
+    so the update takes as long as the slowest panel instead of the sum.
+
+    panels: PanelSession objects (kept open, reused across calls) or configs
+    - "COM4", ("COM4", 9600) or {"port": "COM4", "baudrate": 9600} - which
+    get a temporary session closed afterwards.
+
+    Returns a PanelResult per panel, in the order given. A failing panel never
+    affects the others, a malformed config included.
+    """
+    # shared by all threads, so streamed packets are materialized first
+    commands = [c.encode("ascii") if isinstance(c, str) else bytes(c) for c in commands]
+    panels = list(panels)
+    if not panels:
+        return []
+
+    workers = max_workers or len(panels)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="panel-fanout") as pool:
+        futures = [pool.submit(_send_one, panel, commands) for panel in panels]
+        return [f.result() for f in futures]
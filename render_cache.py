@@ -0,0 +1,168 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from panel_profile import default_profile
+
+
+# ========================= CACHE KEYS ==================================
+
+_font_hashes = {}
+
+
+def font_fingerprint(font):
+    """
+    Identify the font a frame was rendered with.
+    File fonts → sha256 of the file (memoized per path/mtime/size),
+    built-in fonts → their name and size.
+    """
+    path = getattr(font, "path", None)
+    if isinstance(path, str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return f"missing:{path}"
+        stamp = (path, st.st_mtime_ns, st.st_size)
+        digest = _font_hashes.get(stamp)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            _font_hashes[stamp] = digest
+        return f"{digest}:{getattr(font, 'size', '')}"
+
+    try:
+        name = " ".join(font.getname())
+    except AttributeError:
+        name = type(font).__name__
+    return f"builtin:{name}:{getattr(font, 'size', '')}"
+
+
+def make_key(text, size_label, color_name, font, invert, width=None, height=None):
+    """Cache key for one generate_led_frames call (frame size last, see _read_disk)."""
+    if width is None or height is None:
+        default = default_profile()
+        width = default.width if width is None else width
+        height = default.height if height is None else height
+    return (text, size_label, color_name, font_fingerprint(font), bool(invert), width, height)
+
+
+# ========================= RENDER CACHE ================================
+
+class RenderCache:
+    """
+    Two-tier cache of rendered frames, stored as packed panel payloads
+    (1024 bytes per frame at 128 px, see comm_library.frames_to_bytes).
+
+    - memory: bounded LRU with max_entries messages
+    - disk (optional): one file per message in disk_dir, survives restarts
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=256, disk_dir=None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------ lookup
+    def get(self, key):
+        """Return list of frame payloads for key, or None on a miss."""
+        with self._lock:
+            payloads = self._entries.get(key)
+            if payloads is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(payloads)
+
+        payloads = self._read_disk(key)
+
+        with self._lock:
+            if payloads is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, payloads)
+        return list(payloads)
+
+    def put(self, key, payloads):
+        payloads = tuple(bytes(p) for p in payloads)
+        with self._lock:
+            self._store(key, payloads)
+        self._write_disk(key, payloads)
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._entries.clear()
+        if disk and self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".frames"):
+                    os.remove(os.path.join(self.disk_dir, name))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------ internals
+    def _store(self, key, payloads):
+        self._entries[key] = payloads
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        name = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, name + ".frames")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        width, height = key[-2:]
+        frame_size = 2 * height * width // 4
+        # files are replaced atomically, so an empty one is an empty render (text "")
+        if len(data) % frame_size:
+            return None  # truncated / foreign file → treat as miss
+        return tuple(data[i:i + frame_size] for i in range(0, len(data), frame_size))
+
+    def _write_disk(self, key, payloads):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(b"".join(payloads))
+            os.replace(tmp, path)  # atomic, readers never see half a file
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 
-import serial
 import serial.tools.list_ports
 
+from panel_session import PanelSession
+
 
 def list_ports():
     print("Available serial ports:")
@@ -16,14 +17,8 @@ def list_ports():
 def test_port(port_name, baudrate=9600):
     print(f"\nTesting port {port_name} at {baudrate} bps...")
     try:
-        with serial.Serial(
-            port=port_name,
-            baudrate=baudrate,
-            bytesize=serial.EIGHTBITS,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            timeout=1,
-        ) as ser:
+        with PanelSession(port_name, baudrate=baudrate, reply_timeout=1) as session:
+            ser = session.serial
 
             print(f"  Opened:     {ser.port}")
             print(f"  is_open:    {ser.is_open}")
@@ -32,18 +27,17 @@ def test_port(port_name, baudrate=9600):
             # Try to read status lines (not all adapters support this)
             try:
                 print(f"  CTS: {ser.cts}, DSR: {ser.dsr}, RI: {ser.ri}, CD: {ser.cd}")
-            except OSError:
+            except (OSError, NotImplementedError):
                 print("  (line status not supported by this driver)")
 
             # Optional: send 1 test byte, just to see if TX works
             test_bytes = b"\x00"
-            sent = ser.write(test_bytes)
-            ser.flush()
+            sent = session.write(test_bytes)
             print(f"  Sent {sent} byte(s) of test data.")
 
             print("  Port test finished OK.")
-    except serial.SerialException as e:
-        print(f"ERROR: Could not open {port_name}: {e}")
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
 
 
 if __name__ == "__main__":
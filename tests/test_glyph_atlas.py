@@ -0,0 +1,83 @@
+"""GlyphAtlas must draw exactly what Pillow draws, also when shared between threads."""
+
+import os
+import threading
+import unittest
+
+from PIL import ImageFont
+
+from text_to_frames import (
+    FONT_SIZES,
+    FONTS_DIR,
+    GlyphAtlas,
+    _layout_strip,
+    _rows_to_mask,
+    render_text_mask,
+)
+
+
+SAMPLES = (
+    "Hello world",
+    "AV Wa To LT yj gq",
+    "Příliš žluťoučký kůň úpěl ďábelské ódy",
+    "R12 Praha hl.n. → Brno | nástupiště 3 | zpoždění 5 min",
+    "0123456789 :;.,-+/()[]{}",
+    "  leading and trailing  ",
+    "i",
+    "",
+)
+
+
+def _fonts():
+    """(file name, size label, font) for every font in fonts/ at every LED size."""
+    for name in sorted(os.listdir(FONTS_DIR)):
+        for size_label, size in FONT_SIZES.items():
+            yield name, size_label, ImageFont.truetype(os.path.join(FONTS_DIR, name), size)
+
+
+def _atlas_mask(atlas, text, multiline, height=16):
+    # the atlas branch of render_text_mask, with an explicit (fresh) atlas
+    w, lines = _layout_strip(text, multiline, atlas.getbbox, height, atlas.font)
+    rows = [0] * height
+    for line, x, y in lines:
+        atlas.draw(rows, w, line, x, y)
+    return _rows_to_mask(rows, w)
+
+
+class GlyphAtlasTest(unittest.TestCase):
+
+    def test_matches_pillow(self):
+        for name, size_label, font in _fonts():
+            for multiline in (False, True):
+                for text in SAMPLES:
+                    with self.subTest(font=name, size=size_label, multiline=multiline, text=text):
+                        pillow = render_text_mask(text, font, multiline, "pillow")
+                        atlas = render_text_mask(text, font, multiline, "atlas")
+                        self.assertEqual(atlas.size, pillow.size)
+                        self.assertEqual(atlas.tobytes(), pillow.tobytes())
+
+    def test_fresh_atlas_shared_between_threads(self):
+        text = SAMPLES[2]
+        for name, size_label, font in _fonts():
+            atlas = GlyphAtlas(font)
+            if not atlas.supports(text):
+                continue
+            expected = render_text_mask(text, font, False, "pillow").tobytes()
+            start = threading.Barrier(8)
+            results = []
+
+            def render():
+                start.wait()
+                results.append(_atlas_mask(atlas, text, False).tobytes())
+
+            threads = [threading.Thread(target=render) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            with self.subTest(font=name, size=size_label):
+                self.assertEqual(results, [expected] * 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,122 +1,233 @@
 from PIL import Image, ImageDraw, ImageFont
+import bisect
 import os
+import threading
+import warnings
+import weakref
 
-import constants
+import render_cache
+from comm_library import bytes_to_frame, packed_bits_to_bytes
+from frame import Frame
+from panel_profile import resolve_profile
 
 
 # ========================= FONT HANDLING ================================
 
-def _center_matrix_horizontally(matrix, background_value=0):
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+# tried in this order when no (usable) font_path is given
+DEFAULT_FONT_FILES = (
+    "arial.ttf",
+    "arialbd.ttf",
+    "verdana.ttf",
+    "SansSerifCollection.ttf",
+)
+
+FONT_SIZES = {
+    "small": 8,     # two-line capable
+    "medium": 11,   # single line
+    "full": 15,     # max height
+}
+
+
+class FontRegistry:
     """
-    Take a IMG_H x IMG_W matrix and horizontally center the non-background pixels.
-    Works for 0/1 or 0/255; anything != background_value is treated as 'lit'.
+    Resolves font files relative to the package fonts/ directory (on any OS)
+    and keeps loaded FreeType fonts per (path, size), so every font file
+    is opened only once per process.
     """
-    if not matrix:
-        return matrix
 
-    height = len(matrix)
-    width = len(matrix[0])
+    def __init__(self, fonts_dir=FONTS_DIR, default_files=DEFAULT_FONT_FILES):
+        self.fonts_dir = fonts_dir
+        self.default_files = tuple(default_files)
+        self._fonts = {}
+        self._lock = threading.Lock()
+
+    def resolve_path(self, font_path):
+        """
+        Find an existing file for font_path, trying it as given, with
+        Windows separators normalized, relative to the package and
+        finally as a file name inside fonts/. Returns None if nothing exists.
+        """
+        if not font_path:
+            return None
+
+        normalized = font_path.replace("\\", os.sep)
+        package_dir = os.path.dirname(self.fonts_dir)
+        candidates = [
+            font_path,
+            normalized,
+            os.path.join(package_dir, normalized),
+            os.path.join(self.fonts_dir, os.path.basename(normalized)),
+        ]
+        for c in candidates:
+            if os.path.isfile(c):
+                return os.path.abspath(c)
+        return None
+
+    def load(self, size_label, font_path=None):
+        """
+        Return (font, path) for size label; path is the font file actually
+        used, or None when falling back to Pillow's built-in font.
+        """
+        if size_label not in FONT_SIZES:
+            raise ValueError("Font size must be: small / medium / full")
+        size = FONT_SIZES[size_label]
 
-    min_col = width
-    max_col = -1
+        if font_path:
+            path = self.resolve_path(font_path)
+            font = self._truetype(path, size) if path else None
+            if font is not None:
+                return font, path
+            warnings.warn(f"Font {font_path!r} could not be loaded, using default fonts")
 
-    # Find bounding box of all lit pixels
-    for row in matrix:
-        for x, val in enumerate(row):
-            if val != background_value:
-                if x < min_col:
-                    min_col = x
-                if x > max_col:
-                    max_col = x
+        for name in self.default_files:
+            path = self.resolve_path(name)
+            font = self._truetype(path, size) if path else None
+            if font is not None:
+                return font, path
 
-    # No lit pixels at all → nothing to center
-    if max_col == -1:
-        return matrix
+        warnings.warn(f"No font found in {self.fonts_dir}, using Pillow's built-in font")
+        return self._builtin(), None
 
-    content_width = max_col - min_col + 1
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
 
-    # Already full width → nothing to center
-    if content_width >= width:
-        return matrix
+    def _truetype(self, path, size):
+        key = (path, size)
+        with self._lock:
+            if key not in self._fonts:
+                try:
+                    self._fonts[key] = ImageFont.truetype(path, size)
+                except (OSError, ValueError):
+                    self._fonts[key] = None  # remember broken files as well
+            return self._fonts[key]
 
-    left_margin = (width - content_width) // 2
+    def _builtin(self):
+        with self._lock:
+            if None not in self._fonts:
+                self._fonts[None] = ImageFont.load_default()
+            return self._fonts[None]
 
-    new_matrix = []
-    for row in matrix:
-        new_row = [background_value] * width
-        segment = row[min_col : max_col + 1]
-        new_row[left_margin : left_margin + content_width] = segment
-        new_matrix.append(new_row)
 
-    return new_matrix
+FONTS = FontRegistry()
+
 
 def load_led_font(size_label, font_path=None):
     """Loads Sans Serif font and maps size label → pixel size."""
-    if size_label == "small":
-        size = 8        # two-line capable
-    elif size_label == "medium":
-        size = 11       # single line
-    elif size_label == "full":
-        size = 15       # max height
-    else:
-        raise ValueError("Font size must be: small / medium / full")
-
-    candidates = [
-        font_path,
-        r"fonts\arial.ttf",
-        r"fonts\arialbd.ttf",
-        r"fonts\verdana.ttf",
-        r"fonts\SansSerifCollection.ttf"
-    ]
-
-    for c in candidates:
-        if not c:
-            continue
-        try:
-            return ImageFont.truetype(c, size)
-        except:
-            pass
-
-    return ImageFont.load_default()
+    font, _ = FONTS.load(size_label, font_path)
+    return font
 
 
 # ========================= TEXT RENDERING ===============================
 
-def render_text_to_strip(text, font, color, multiline):
+RENDERERS = ("pillow", "atlas")
+
+
+_advances = weakref.WeakKeyDictionary()
+
+
+def glyph_advances(font):
+    """Shared {character: advance in pixels} of font, filled as characters are met."""
+    advances = _advances.get(font)
+    if advances is None:
+        advances = _advances[font] = {}
+    return advances
+
+
+def balance_lines(text, font):
     """
-    Renders full text into one long 16-pixel tall strip.
-    multiline=True → two lines using 8px height each.
+    Split text into two lines for the two-line "small" mode so that the wider
+    line is as narrow as possible (and with it the strip and frame count).
+
+    Breaks at word boundaries (the spaces are dropped); text without spaces is
+    broken between characters. Widths come from per-character advances
+    measured once per font, so all breaks are compared in one linear pass.
     """
+    if len(text) < 2:
+        return "", text  # nothing to balance, keep it on the bottom line
 
-    # compute bounding box width of whole text
-    dummy = ImageDraw.Draw(Image.new("RGB", (1, 1)))
-    bbox = dummy.textbbox((0, 0), text, font=font)
-    w = bbox[2] - bbox[0]
+    advances = glyph_advances(font)
+    widths = []
+    for ch in text:
+        adv = advances.get(ch)
+        if adv is None:
+            adv = advances[ch] = font.getlength(ch)
+        widths.append(adv)
+    total = sum(widths)
+
+    words = " " in text.strip(" ")
+    best = None
+    left = 0.0
+    inked = False   # a non-space character lies left of i (no empty first line)
+    i = 0
+    n = len(text)
+    while i < n:
+        if words:
+            if text[i] == " " and inked:
+                j = i
+                run = 0.0
+                while j < n and text[j] == " ":
+                    run += widths[j]
+                    j += 1
+                if j < n:
+                    cost = max(left, total - left - run)
+                    if best is None or cost < best[0]:
+                        best = (cost, i, j)
+                left += run
+                i = j
+                continue
+        elif i:
+            cost = max(left, total - left)
+            if best is None or cost < best[0]:
+                best = (cost, i, i)
+        inked = inked or text[i] != " "
+        left += widths[i]
+        i += 1
+
+    _, end, start = best
+    return text[:end], text[start:]
+
+
+def _layout_strip(text, multiline, textbbox, height, font=None):
+    """
+    Compute strip width and the (line, x, y) origins to draw each line at.
+    textbbox(s) must return the bounding box of s drawn at (0, 0); font is
+    needed to balance the two lines of the multiline mode.
+    """
+    boxes = {}
+
+    def bbox_of(s):
+        box = boxes.get(s)
+        if box is None:
+            box = boxes[s] = textbbox(s)
+        return box
 
     if multiline:
-        # naive split
-        split_index = len(text) // 2
-        line1 = text[:split_index]
-        line2 = text[split_index:]
+        if font is not None:
+            line1, line2 = balance_lines(text, font)
+        else:
+            split_index = len(text) // 2
+            line1, line2 = text[:split_index], text[split_index:]
 
-        bbox1 = dummy.textbbox((0, 0), line1, font=font)
-        bbox2 = dummy.textbbox((0, 0), line2, font=font)
+        bbox1 = bbox_of(line1)
+        bbox2 = bbox_of(line2)
 
         w = max(bbox1[2] - bbox1[0], bbox2[2] - bbox2[0])
-        total_height = constants.IMG_H
     else:
+        # compute bounding box width of whole text
+        bbox = bbox_of(text)
+        w = bbox[2] - bbox[0]
+
         line1 = text
         line2 = ""
-        total_height = constants.IMG_H
 
-    # create full strip
-    strip = Image.new("RGB", (w, total_height), (0, 0, 0))
-    mask = Image.new("1", (w, total_height), 0)
-    draw_mask = ImageDraw.Draw(mask)
+    lines = []
 
     # -------- FIRST LINE (BOTTOM-ALIGNED) --------
     if line1:
-        bbox1 = dummy.textbbox((0, 0), line1, font=font)
+        bbox1 = bbox_of(line1)
         glyph_h1 = bbox1[3] - bbox1[1]
 
         if multiline:
@@ -125,138 +236,867 @@ def render_text_to_strip(text, font, color, multiline):
             base_y1 = y_top_1 - bbox1[1]
         else:
             # single line → bottom-aligned in all 16px
-            y_bottom_1 = constants.IMG_H - glyph_h1
+            y_bottom_1 = height - glyph_h1
             base_y1 = y_bottom_1 - bbox1[1]
 
-        draw_mask.text((0 - bbox1[0], base_y1), line1, font=font, fill=1)
+        lines.append((line1, 0 - bbox1[0], base_y1))
 
     # -------- SECOND LINE (BOTTOM-ALIGNED IN LOWER HALF) --------
     if multiline and line2:
-        bbox2 = dummy.textbbox((0, 0), line2, font=font)
+        bbox2 = bbox_of(line2)
         glyph_h2 = bbox2[3] - bbox2[1]
 
         # second line must sit in pixels 8–15 (lower half)
-        y_bottom_2 = constants.IMG_H - glyph_h2
+        y_bottom_2 = height - glyph_h2
         # but do not overlap upper line → force ≥ 8px
         if y_bottom_2 < 8:
             y_bottom_2 = 8
 
         base_y2 = y_bottom_2 - bbox2[1]
 
-        draw_mask.text((0 - bbox2[0], base_y2), line2, font=font, fill=1)
+        lines.append((line2, 0 - bbox2[0], base_y2))
+
+    return w, lines
 
-    # paste colored text
+
+def render_text_to_strip(text, font, color, multiline, renderer="pillow", profile=None):
+    """
+    Renders full text into one long 16-pixel tall strip (profile height).
+    multiline=True → two lines using 8px height each.
+    renderer="atlas" composes the strip from cached glyph bitmaps
+    (see GlyphAtlas) instead of drawing the whole string through Pillow.
+    """
+    mask = render_text_mask(text, font, multiline, renderer, profile)
+
+    # create full strip and paste colored text
+    strip = Image.new("RGB", mask.size, (0, 0, 0))
     strip.paste(color, mask=mask)
     return strip
 
 
+def render_text_mask(text, font, multiline, renderer="pillow", profile=None):
+    """Same as render_text_to_strip, but only the 1-bit text mask (mode "1")."""
+    if renderer not in RENDERERS:
+        raise ValueError("Renderer must be: " + " / ".join(RENDERERS))
+    height = resolve_profile(profile).height
+
+    if renderer == "atlas" and _atlas_supported(font, text):
+        atlas = glyph_atlas(font)
+        w, lines = _layout_strip(text, multiline, atlas.getbbox, height, font)
+        rows = [0] * height
+        for line, x, y in lines:
+            atlas.draw(rows, w, line, x, y)
+        return _rows_to_mask(rows, w)
+
+    dummy = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    w, lines = _layout_strip(
+        text, multiline, lambda s: dummy.textbbox((0, 0), s, font=font), height, font
+    )
+    mask = Image.new("1", (w, height), 0)
+    draw_mask = ImageDraw.Draw(mask)
+    for line, x, y in lines:
+        draw_mask.text((x, y), line, font=font, fill=1)
+    return mask
+
+
+# ========================= GLYPH ATLAS =================================
+
+class _Glyph:
+    __slots__ = ("advance", "bbox", "exact", "rows", "width", "left", "top", "min_left", "lift")
+
+    def __init__(self):
+        self.advance = {}      # mode → pen advance in 26.6 units
+        self.bbox = {}         # mode → getbbox() of the glyph alone
+        self.exact = True      # False → metrics can't be reproduced, use Pillow
+        self.rows = ()         # ink rows as ints, leftmost pixel = highest bit
+        self.width = 0
+        self.left = 0          # ink column relative to the pen position
+        self.top = 0           # ink row relative to the line's reference row
+        self.min_left = 0      # min(0, FreeType bitmap_left)
+        self.lift = None       # how far the glyph raises the line's bitmap top
+
+
+class _PlacedLine:
+    """Glyphs of one laid-out line with absolute ink columns and rows."""
+
+    __slots__ = ("box", "glyphs", "xs", "tops", "ends", "starts")
+
+    def __init__(self, box):
+        self.box = box         # mask box of the line (clip rectangle)
+        self.glyphs = []
+        self.xs = []           # ink start column per glyph
+        self.tops = []         # ink top row per glyph
+        self.ends = []         # running max of ink end columns (for bisect)
+        self.starts = []       # running min of ink start columns from the right
+
+    def add(self, glyph, x, top):
+        self.glyphs.append(glyph)
+        self.xs.append(x)
+        self.tops.append(top)
+
+    def finish(self):
+        end = None
+        for g, x in zip(self.glyphs, self.xs):
+            end = x + g.width if end is None else max(end, x + g.width)
+            self.ends.append(end)
+        start = None
+        for x in reversed(self.xs):
+            start = x if start is None else min(start, x)
+            self.starts.append(start)
+        self.starts.reverse()
+
+
+class GlyphAtlas:
+    """
+    1-bit bitmaps and metrics of every glyph of one font, measured once per
+    character, so that strips can be composed without asking FreeType to
+    lay out and rasterize the whole message again.
+
+    Pillow positions the text mask by the outline box of the whole line but
+    places glyphs by their bitmap origins, so both are measured per glyph
+    (against a reference glyph) and combined per line the way _imagingft
+    does. Glyphs whose metrics can't be reproduced exactly (fractional or
+    zero advances, unexpected clipping) mark the text as unsupported and
+    render_text_to_strip falls back to Pillow.
+    """
+
+    REFERENCE = "H"
+
+    def __init__(self, font):
+        self.font = font
+        self._glyphs = {}
+        self._pairs = {}
+        self._calibrated = None    # (pad, reference_top), published once complete
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ layout
+    def supports(self, text):
+        return all(self.glyph(ch).exact for ch in text)
+
+    def advance(self, ch, next_ch, mode):
+        """Pen advance after ch in 26.6 units, including kerning with next_ch."""
+        if next_ch is None:
+            return self.glyph(ch).advance[mode]
+        key = (ch + next_ch, mode)
+        adv = self._pairs.get(key)
+        if adv is None:
+            pair_len = round(self.font.getlength(ch + next_ch, mode=mode) * 64)
+            adv = self._pairs[key] = pair_len - self.glyph(next_ch).advance[mode]
+        return adv
+
+    def layout(self, text, mode):
+        """
+        Pixel pen positions and bounding box of text as FreeType's basic
+        layout computes them for the given mode ("1" draws, "L" measures).
+        """
+        if not text:
+            return [], (0, 0, 0, 0)
+
+        positions = []
+        pen = 0
+        x0 = x1 = 0
+        y0 = y1 = None
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            px = (pen + 32) >> 6  # FreeType PIXEL() rounding
+            positions.append(px)
+            bb = self.glyph(ch).bbox[mode]
+            x0 = min(x0, px + bb[0])
+            x1 = max(x1, px + bb[2])
+            y0 = bb[1] if y0 is None else min(y0, bb[1])
+            y1 = bb[3] if y1 is None else max(y1, bb[3])
+            pen += self.advance(ch, text[i + 1] if i < last else None, mode)
+            x1 = max(x1, (pen + 32) >> 6)
+        return positions, (x0, y0, x1, y1)
+
+    def getbbox(self, text):
+        """Same as font.getbbox(text) (the mode used by ImageDraw.textbbox on RGB)."""
+        return self.layout(text, "L")[1]
+
+    def draw(self, rows, width, text, x, y):
+        """OR text drawn at (x, y) into rows (ints of width bits each)."""
+        self.draw_placed(rows, self.place(text, x, y), 0, width, width)
+
+    def place(self, text, x, y):
+        """Lay text out at (x, y) once, for drawing window by window."""
+        positions, (x0, y0, x1, y1) = self.layout(text, "1")
+        glyphs = [self.glyph(ch) for ch in text]
+
+        # glyph bitmaps are shifted by the leftmost bitmap origin of the line,
+        # rows by the highest bitmap top
+        min_left = min((min(0, g.min_left + px) for g, px in zip(glyphs, positions)), default=0)
+        lifts = [g.lift for g in glyphs if g.lift is not None]
+        lift = max(lifts) if lifts else 0
+
+        origin_x = x + x0 - min_left
+        origin_y = y + y0 + lift
+        placed = _PlacedLine((x + x0, y + y0, x + x1, y + y1))
+        for g, px in zip(glyphs, positions):
+            if g.rows:
+                placed.add(g, origin_x + px + g.left, origin_y + g.top)
+        placed.finish()
+        return placed
+
+    def draw_placed(self, rows, placed, left, width, strip_width):
+        """
+        OR a placed line into rows holding columns left … left+width of a
+        strip_width wide strip. Only glyphs reaching into the window are drawn.
+        """
+        # text is clipped to its mask, then to the strip, then to the window
+        clip_l = max(placed.box[0], 0, left)
+        clip_r = min(placed.box[2], strip_width, left + width)
+        clip_t = max(placed.box[1], 0)
+        clip_b = min(placed.box[3], len(rows))
+        if clip_l >= clip_r or clip_t >= clip_b:
+            return
+        right = left + width
+        clip = ((1 << (clip_r - clip_l)) - 1) << (right - clip_r)
+
+        first = bisect.bisect_right(placed.ends, clip_l)
+        last = bisect.bisect_left(placed.starts, clip_r)
+        for i in range(first, last):
+            g = placed.glyphs[i]
+            shift = right - placed.xs[i] - g.width
+            top = placed.tops[i]
+            for r, bits in enumerate(g.rows):
+                yy = top + r
+                if bits and clip_t <= yy < clip_b:
+                    rows[yy] |= (bits << shift if shift >= 0 else bits >> -shift) & clip
+
+    # ------------------------------------------------------------------ rasterizing
+    def glyph(self, ch):
+        g = self._glyphs.get(ch)
+        if g is None:
+            g = self._glyphs[ch] = self._measure(ch)
+        return g
+
+    def _measure(self, ch):
+        font = self.font
+        g = _Glyph()
+        for mode in ("1", "L"):
+            g.advance[mode] = round(font.getlength(ch, mode=mode) * 64)
+            g.bbox[mode] = font.getbbox(ch, mode=mode)
+            if g.advance[mode] <= 0 or g.advance[mode] % 64:
+                g.exact = False
+        if not g.exact or ch == " ":
+            return g
+
+        pad, reference_top = self._calibration()
+        if reference_top is None:
+            g.exact = False
+            return g
+
+        # ch alone
+        single, _ = _mask_ink(font, ch)
+
+        # ch after the reference glyph; the padding keeps both clear of any
+        # clipping and of each other
+        context = pad + self.REFERENCE + pad + ch + pad
+        ref_x = _pen_x(font, context, len(pad))
+        own_x = _pen_x(font, context, len(pad) * 2 + 1)
+        span = 4 * font.size
+        ink, offset = _mask_ink(font, context)
+        if offset[0] != 0 or ink is None:
+            g.exact = False
+            return g
+
+        ref = _ink_box(ink, ref_x - span, ref_x + span)
+        own = _ink_box(ink, own_x - span, own_x + span)
+        if ref is None or single is None or own is None:
+            if own is None and single is None and ref is not None:
+                raised = ref[1] - reference_top
+                g.lift = raised if raised > 0 else None
+                return g
+            g.exact = False
+            return g
+
+        raised = ref[1] - reference_top             # ch raises the line top by this
+        lowered = own[1] - _ink_box(single, 0, single.size[0])[1]
+        if raised < 0 or lowered < 0 or (raised and lowered):
+            g.exact = False
+            return g
+
+        left, top, right, bottom = own
+        g.width = right - left
+        g.rows = _image_rows(ink.crop((left, top, right, bottom)))
+        g.left = left - own_x
+        g.top = top - raised
+        g.lift = raised - lowered
+        g.min_left = min(0, g.left - _ink_box(single, 0, single.size[0])[0])
+        return g
+
+    def _calibration(self):
+        calibrated = self._calibrated
+        if calibrated is None:
+            # atlases are shared between threads: compute into locals and
+            # publish the finished pair, never half of it
+            with self._lock:
+                calibrated = self._calibrated
+                if calibrated is None:
+                    space = max(1, round(self.font.getlength(" ", mode="1")))
+                    pad = " " * (8 * self.font.size // space + 1)
+                    ink, _ = _mask_ink(self.font, pad + self.REFERENCE + pad)
+                    box = _ink_box(ink, 0, ink.size[0]) if ink is not None else None
+                    calibrated = self._calibrated = (pad, box[1] if box else None)
+        return calibrated
+
+
+_atlases = weakref.WeakKeyDictionary()
+
+
+def glyph_atlas(font):
+    """Shared GlyphAtlas for font (fonts are cached by FONTS, so atlases are too)."""
+    atlas = _atlases.get(font)
+    if atlas is None:
+        atlas = _atlases[font] = GlyphAtlas(font)
+    return atlas
+
+
+def _atlas_supported(font, text):
+    # the atlas reproduces FreeType's basic layout of a single line only
+    return (
+        isinstance(font, ImageFont.FreeTypeFont)
+        and font.layout_engine == ImageFont.Layout.BASIC
+        and "\n" not in text
+        and "\r" not in text
+        and glyph_atlas(font).supports(text)
+    )
+
+
+def _pen_x(font, text, index):
+    """Pixel pen position of text[index] in FreeType's basic layout (mode "1")."""
+    pen = round(font.getlength(text[:index + 1], mode="1") * 64)
+    pen -= round(font.getlength(text[index], mode="1") * 64)
+    return (pen + 32) >> 6
+
+
+def _mask_ink(font, text):
+    """Draw text in mode "1" exactly like ImageDraw.text → (image, mask offset)."""
+    mask, offset = font.getmask2(text, mode="1")
+    w, h = mask.size
+    if not w or not h:
+        return None, offset
+    img = Image.new("1", (w, h), 0)
+    ImageDraw.Draw(img).text((-offset[0], -offset[1]), text, font=font, fill=1)
+    return img, offset
+
+
+def _ink_box(img, x_from, x_to):
+    """Bounding box of lit pixels of img between columns x_from and x_to."""
+    if img is None:
+        return None
+    x_from = max(x_from, 0)
+    x_to = min(x_to, img.size[0])
+    if x_from >= x_to:
+        return None
+    box = img.crop((x_from, 0, x_to, img.size[1])).getbbox()
+    if box is None:
+        return None
+    return box[0] + x_from, box[1], box[2] + x_from, box[3]
+
+
+def _image_rows(img):
+    """Mode "1" image → tuple of row ints (leftmost pixel = highest bit)."""
+    w, h = img.size
+    stride = (w + 7) // 8
+    pad = stride * 8 - w
+    data = img.tobytes()
+    return tuple(
+        int.from_bytes(data[y * stride:(y + 1) * stride], "big") >> pad for y in range(h)
+    )
+
+
+def _rows_to_mask(rows, width):
+    """Row ints (leftmost pixel = highest bit) → mode "1" mask image."""
+    if width <= 0:
+        return Image.new("1", (max(width, 0), len(rows)), 0)
+    stride = (width + 7) // 8
+    pad = stride * 8 - width
+    data = b"".join((row << pad).to_bytes(stride, "big") for row in rows)
+    return Image.frombytes("1", (width, len(rows)), data)
+
 
 # ========================= FRAME CUTTING ===============================
 
-def split_strip_into_frames(strip):
-    """Cuts long strip into 16×128 frames."""
+def split_strip_into_frames(strip, profile=None):
+    """Cuts long strip into 16×128 frames (the profile's frame size)."""
     frames = []
     W = strip.width
-    num_frames = (W + constants.IMG_W - 1) // constants.IMG_W  # ceil
+    fw, fh = _frame_size(profile)
+    num_frames = (W + fw - 1) // fw  # ceil
 
     for i in range(num_frames):
-        frame = Image.new("RGB", (constants.IMG_W, constants.IMG_H), (0, 0, 0))
-        x0 = i * constants.IMG_W
-        crop = strip.crop((x0, 0, x0 + constants.IMG_W, constants.IMG_H))
+        frame = Image.new("RGB", (fw, fh), (0, 0, 0))
+        x0 = i * fw
+        crop = strip.crop((x0, 0, x0 + fw, fh))
         frame.paste(crop, (0, 0))
         frames.append(frame)
 
     return frames
 
 
+def _frame_size(profile):
+    profile = resolve_profile(profile)
+    return profile.width, profile.height
+
+
 # ========================= MATRIX CONVERSION ===========================
 
-def image_to_led_matrices(img):
-    red = [[0] * constants.IMG_W for _ in range(constants.IMG_H)]
-    green = [[0] * constants.IMG_W for _ in range(constants.IMG_H)]
-    px = img.load()
+# channel value → lit (any non-zero value counts)
+_LIT_01 = [0] + [1] * 255
+_LIT_0255 = [0] + [255] * 255
 
-    for y in range(constants.IMG_H):
-        for x in range(constants.IMG_W):
-            r, g, _ = px[x, y]
-            red[y][x] = 1 if r > 0 else 0
-            green[y][x] = 1 if g > 0 else 0
 
-    return red, green
+def _led_channels(img, lut, mode=None, profile=None):
+    """Threshold red and green of the IMG_H × IMG_W frame in bulk → two images."""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    size = _frame_size(profile)
+    if img.size != size:
+        img = img.crop((0, 0) + size)
+    r, g, _ = img.split()
+    return r.point(lut, mode), g.point(lut, mode)
+
+
+def image_to_led_matrices(img, profile=None):
+    """RGB frame → (red, green) IMG_H × IMG_W lists of 0/1."""
+    w, h = _frame_size(profile)
+    red, green = _led_channels(img, _LIT_01, None, profile)
+    r_data = red.tobytes()
+    g_data = green.tobytes()
+    rows = range(0, w * h, w)
+    return [list(r_data[i:i + w]) for i in rows], [list(g_data[i:i + w]) for i in rows]
+
+
+def image_to_led_bits(img, profile=None):
+    """
+    RGB frame → (red, green) as packed bits, IMG_W / 8 bytes per row,
+    leftmost pixel in the highest bit (Pillow mode "1" layout).
+    """
+    red, green = _led_channels(img, _LIT_0255, "1", profile)
+    return red.tobytes(), green.tobytes()
+
+
+def image_to_led_bytes(img, profile=None):
+    """RGB frame → 1024-byte panel payload (red + green), no matrices in between."""
+    red, green = image_to_led_bits(img, profile)
+    return packed_bits_to_bytes(red) + packed_bits_to_bytes(green)
 
 
 # ========================= MAIN ENTRY =================================
 
+_COLORS = {
+    "red": (255, 0, 0),
+    "green": (0, 255, 0),
+    "yellow": (255, 255, 0),
+}
+
+
+def _channel_bits(lit, color_name):
+    """
+    Lit bits of the text → (red, green) packed bits. The channels are taken
+    by reference: yellow shares one bytes object, the unused one is blank.
+    """
+    blank = bytes(len(lit))
+    red = lit if color_name in ("red", "yellow") else blank
+    green = lit if color_name in ("green", "yellow") else blank
+    return red, green
+
+
 def generate_led_frames(
     text,
     size_label="full",
     color_name="red",
     font_path=None,
     invert=False,
+    cache=None,
+    packed=False,
+    renderer="pillow",
+    lazy=False,
+    as_frames=False,
+    profile=None,
 ):
 
     """
     size_label = "small" / "medium" / "full"
     color_name = "red" / "green" / "yellow"
+    cache      = optional render_cache.RenderCache, repeated messages become a lookup
+    packed     = True → return 1024-byte panel payloads instead of matrices
+    as_frames  = True → return frame.Frame objects (packed bits) instead of matrices
+    renderer   = "pillow" / "atlas" (same pixels, atlas is faster for long text)
+    lazy       = True → frames rendered while iterating (see iter_led_frames);
+                 cache hits are still served, misses are not stored
+    profile    = panel_profile.PanelProfile of the target panel (frame size),
+                 None → the values in constants.py
     """
 
-    colors = {
-        "red": (255, 0, 0),
-        "green": (0, 255, 0),
-        "yellow": (255, 255, 0),
-    }
-    if color_name not in colors:
+    if color_name not in _COLORS:
         raise ValueError("Color must be red/green/yellow")
 
-    color = colors[color_name]
-
+    profile = resolve_profile(profile)
     font = load_led_font(size_label, font_path)
+
+    key = None
+    if cache is not None:
+        key = render_cache.make_key(text, size_label, color_name, font, invert, profile.width, profile.height)
+        payloads = cache.get(key)
+        if payloads is not None:
+            return _from_payloads(payloads, packed, as_frames, profile)
+
+    if lazy:
+        if renderer not in RENDERERS:
+            raise ValueError("Renderer must be: " + " / ".join(RENDERERS))
+        return LazyLedFrames(
+            text, size_label, color_name, font, invert, packed, renderer, as_frames, profile
+        )
+
+    frames = _render_led_frames(text, size_label, color_name, font, invert, renderer, profile)
+
+    if cache is not None:
+        cache.put(key, [f.to_payload() for f in frames])
+    return _from_frames(frames, packed, as_frames)
+
+
+def _from_payloads(payloads, packed, as_frames, profile):
+    """Panel payloads → the output format generate_led_frames was asked for."""
+    if packed:
+        return list(payloads)
+    if as_frames:
+        return [Frame.from_payload(p, profile.width, profile.height) for p in payloads]
+    return [bytes_to_frame(p, profile.width) for p in payloads]
+
+
+def _from_frames(frames, packed, as_frames):
+    """Frame objects → the output format generate_led_frames was asked for."""
+    if packed:
+        return [f.to_payload() for f in frames]
+    if as_frames:
+        return frames
+    return [f.to_tuple() for f in frames]
+
+
+def _render_led_frames(text, size_label, color_name, font, invert, renderer="pillow", profile=None):
+    """Render text → list of frame.Frame (centered if it fits one frame, inverted if asked)."""
+    profile = resolve_profile(profile)
     multiline = (size_label == "small")
+    w, h = profile.width, profile.height
 
-    strip = render_text_to_strip(text, font, color, multiline)
+    # the text stays a single 1-bit mask, cut into windows and colored by
+    # choosing the channels - no RGB strip or frames are ever allocated
+    mask = render_text_mask(text, font, multiline, renderer, profile)
+    count = (mask.width + w - 1) // w
 
     frames = []
-    for img in split_strip_into_frames(strip):
-        frames.append(image_to_led_matrices(img))
+    for x in range(0, count * w, w):
+        red, green = _channel_bits(mask.crop((x, 0, x + w, h)).tobytes(), color_name)
+        frames.append(Frame(red, green, w, h))
 
     # If the text fits into a single frame, center it horizontally
+    # (a shift of the packed rows by the lit column span)
     if len(frames) == 1:
-        red, green = frames[0]
+        frames[0] = frames[0].centered()
+
+    # inversion is an XOR of the text's channels with the full column mask
+    if invert:
+        red = color_name in ("red", "yellow")
+        green = color_name in ("green", "yellow")
+        frames = [f.inverted(red, green) for f in frames]
 
-        # Center both color channels based on lit pixels
-        red_centered = _center_matrix_horizontally(red, background_value=0)
-        green_centered = _center_matrix_horizontally(green, background_value=0)
+    return frames
 
-        frames[0] = (red_centered, green_centered)
+# ========================= LAZY FRAMES =================================
 
-    # frames is a list of (red_matrix, green_matrix),
-    # each matrix is IMG_H x IMG_W with 0/1 (or 0/255 etc.)
-    if invert:
-        inverted_frames = []
-        for red, green in frames:
-            inv_red = []
-            if color_name in ["red", "yellow"]:
-                for row in red:
-                    inv_row = []
-                    for px in row:
-                        bit = px & 1  # works for 0/1 or 0/255
-                        inv_row.append(0 if bit else 1)
-                    inv_red.append(inv_row)
-            else:
-                inv_red = red
-
-            inv_green = []
-            if color_name in ["green", "yellow"]:
-                for row in green:
-                    inv_row = []
-                    for px in row:
-                        bit = px & 1
-                        inv_row.append(0 if bit else 1)
-                    inv_green.append(inv_row)
-            else:
-                inv_green = green
-
-            inverted_frames.append((inv_red, inv_green))
-        frames = inverted_frames
-
-    return frames
\ No newline at end of file
+_INVERT_BITS = bytes(255 - v for v in range(256))
+
+
+class LazyLedFrames:
+    """
+    Frames of one text, rendered window by window while iterating instead of
+    as one strip up front (see iter_led_frames). len() is known without
+    rendering, so it can be passed straight to iter_show_custom_imgs.
+    Iterating again renders again.
+    """
+
+    def __init__(self, text, size_label, color_name, font, invert, packed, renderer, as_frames=False,
+                 profile=None):
+        self.text = text
+        self.size_label = size_label
+        self.color_name = color_name
+        self.font = font
+        self.invert = invert
+        self.packed = packed
+        self.renderer = renderer
+        self.as_frames = as_frames
+        self.profile = profile = resolve_profile(profile)
+
+        multiline = (size_label == "small")
+        if renderer == "atlas" and _atlas_supported(font, text):
+            atlas = glyph_atlas(font)
+            self.width, lines = _layout_strip(text, multiline, atlas.getbbox, profile.height, font)
+            self._lines = [atlas.place(line, x, y) for line, x, y in lines]
+            self._atlas = atlas
+            self._mask = None
+        else:
+            # Pillow lays out whole lines only → draw the 1-bit mask once
+            # (1 bit per pixel, never the RGB strip) and cut windows from it
+            self._mask = render_text_mask(text, font, multiline, "pillow", profile)
+            self.width = self._mask.width
+            self._lines = self._atlas = None
+
+    def __len__(self):
+        w = self.profile.width
+        return (self.width + w - 1) // w
+
+    def __iter__(self):
+        profile = self.profile
+        if len(self) <= 1:
+            # single frames get centered → use the eager path as is
+            frames = _render_led_frames(
+                self.text, self.size_label, self.color_name, self.font, self.invert, self.renderer,
+                profile,
+            )
+            yield from _from_frames(frames, self.packed, self.as_frames)
+            return
+
+        for i in range(len(self)):
+            red, green = self._frame_bits(self._window_bits(i * profile.width))
+            if self.as_frames and not self.packed:
+                yield Frame(red, green, profile.width, profile.height)
+                continue
+            red = packed_bits_to_bytes(red)
+            green = red if self.color_name == "yellow" else packed_bits_to_bytes(green)
+            payload = red + green
+            yield payload if self.packed else bytes_to_frame(payload, profile.width)
+
+    def _window_bits(self, left):
+        """Packed mask bits (Pillow mode "1" layout) of columns left … left+IMG_W."""
+        w, h = self.profile.width, self.profile.height
+        if self._mask is not None:
+            return self._mask.crop((left, 0, left + w, h)).tobytes()
+        rows = [0] * h
+        for placed in self._lines:
+            self._atlas.draw_placed(rows, placed, left, w, self.width)
+        return b"".join(row.to_bytes(w // 8, "big") for row in rows)
+
+    def _frame_bits(self, lit):
+        """Text mask bits of one window → (red, green) packed bits."""
+        if self.invert:
+            lit = lit.translate(_INVERT_BITS)
+        return _channel_bits(lit, self.color_name)
+
+
+def iter_led_frames(
+    text,
+    size_label="full",
+    color_name="red",
+    font_path=None,
+    invert=False,
+    packed=False,
+    renderer="atlas",
+    as_frames=False,
+    profile=None,
+):
+    """
+    Lazy generate_led_frames for very long texts: returns a LazyLedFrames that
+    renders and yields the same frames one IMG_W window at a time, so the
+    full-width strip is never allocated. With the glyph atlas only glyphs
+    reaching into the current window are drawn; texts the atlas can't
+    reproduce keep just a 1-bit mask of the strip.
+    """
+    if color_name not in _COLORS:
+        raise ValueError("Color must be red/green/yellow")
+    if renderer not in RENDERERS:
+        raise ValueError("Renderer must be: " + " / ".join(RENDERERS))
+
+    font = load_led_font(size_label, font_path)
+    return LazyLedFrames(text, size_label, color_name, font, invert, packed, renderer, as_frames, profile)
+
+
+# ========================= SMOOTH SCROLL ===============================
+
+def iter_scroll_frames(
+    text,
+    size_label="full",
+    color_name="red",
+    font_path=None,
+    invert=False,
+    step=1,
+    max_frames=None,
+    packed=False,
+    as_frames=False,
+    renderer="atlas",
+    profile=None,
+):
+    """
+    Frames of text scrolling right to left by step pixels per frame: the text
+    enters at the right edge and scrolls until it has left the panel.
+
+    The text is rendered once into a 1-bit mask kept as one int per row;
+    every frame is a window of those rows taken by shift and mask, nothing
+    is drawn, cropped or pasted per frame. Identical consecutive frames
+    (blank gaps, runs of spaces) are yielded once. max_frames caps the
+    count by raising the step (the panel holds constants.SLOT_LABELS frames).
+    """
+    if color_name not in _COLORS:
+        raise ValueError("Color must be red/green/yellow")
+    if step < 1:
+        raise ValueError("step must be at least 1 pixel")
+    if max_frames is not None and max_frames < 1:
+        raise ValueError("max_frames must be at least 1")
+
+    profile = resolve_profile(profile)
+    w, h = profile.width, profile.height
+    font = load_led_font(size_label, font_path)
+    mask = render_text_mask(text, font, size_label == "small", renderer, profile)
+    rows = _image_rows(mask)
+    strip_w = mask.width
+
+    # window left edges: text just entering on the right … just gone on the left
+    span = strip_w + w - 1
+    if max_frames is not None:
+        step = max(step, -(-span // max_frames))
+    window = (1 << w) - 1
+    row_bytes = profile.row_bytes
+
+    previous = None
+    for left in range(1 - w, strip_w, step):
+        shift = strip_w - left - w
+        lit = b"".join(
+            ((row >> shift if shift >= 0 else row << -shift) & window).to_bytes(row_bytes, "big")
+            for row in rows
+        )
+        if lit == previous:
+            continue
+        previous = lit
+        if invert:
+            lit = lit.translate(_INVERT_BITS)
+        red, green = _channel_bits(lit, color_name)
+        frame = Frame(red, green, w, h)
+        if packed:
+            yield frame.to_payload()
+        elif as_frames:
+            yield frame
+        else:
+            yield frame.to_tuple()
+
+
+# ========================= BATCH RENDERING =============================
+
+_BATCH_FIELDS = ("text", "size_label", "color_name", "font_path", "invert")
+
+
+def _batch_job(job):
+    """Normalize a batch entry (text, tuple or dict) → tuple of _BATCH_FIELDS."""
+    if isinstance(job, str):
+        job = (job,)
+    if isinstance(job, dict):
+        unknown = set(job) - set(_BATCH_FIELDS)
+        if unknown:
+            raise ValueError("Unknown batch job fields: " + ", ".join(sorted(unknown)))
+        job = tuple(job.get(name) for name in _BATCH_FIELDS)
+    job = tuple(job)
+    if not job or len(job) > len(_BATCH_FIELDS):
+        raise ValueError("Batch job must be (text, size_label, color_name, font_path, invert)")
+    text, size_label, color_name, font_path, invert = job + (None,) * (len(_BATCH_FIELDS) - len(job))
+    return (
+        text,
+        size_label or "full",
+        color_name or "red",
+        font_path or None,
+        bool(invert),
+    )
+
+
+def _init_batch_worker(fonts):
+    """Pool initializer: load every font of the batch once per worker process."""
+    for size_label, font_path in fonts:
+        load_led_font(size_label, font_path)
+
+
+def _render_batch_job(job, renderer, profile):
+    """Render one job in a worker → all frame payloads joined into one bytes object."""
+    text, size_label, color_name, font_path, invert = job
+    return b"".join(generate_led_frames(
+        text, size_label, color_name, font_path, invert,
+        packed=True, renderer=renderer, profile=profile,
+    ))
+
+
+def generate_led_frames_batch(
+    jobs,
+    max_workers=None,
+    packed=False,
+    as_frames=False,
+    renderer="atlas",
+    cache=None,
+    profile=None,
+    executor=None,
+):
+    """
+    Render many messages in parallel → one generate_led_frames result per job,
+    in the order of jobs.
+
+    jobs       = texts, (text, size_label, color_name, font_path, invert)
+                 tuples (trailing fields optional) or dicts with those keys
+    max_workers= worker processes (None → os.cpu_count())
+    executor   = optional concurrent.futures.ProcessPoolExecutor to reuse
+                 across batches (max_workers is then ignored)
+    cache      = optional render_cache.RenderCache, consulted and filled
+                 in this process
+
+    Workers load each font of the batch once and send back packed payloads
+    (1024 bytes per frame at 128 px) instead of pickled matrices. Identical
+    jobs are rendered once. Batches of one job, or max_workers=1, are
+    rendered in this process.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if renderer not in RENDERERS:
+        raise ValueError("Renderer must be: " + " / ".join(RENDERERS))
+    profile = resolve_profile(profile)
+    jobs = [_batch_job(job) for job in jobs]
+    for job in jobs:
+        if job[2] not in _COLORS:
+            raise ValueError("Color must be red/green/yellow")
+
+    payloads = {}   # job → payloads
+    keys = {}
+    if cache is not None:
+        for job in dict.fromkeys(jobs):
+            text, size_label, color_name, font_path, invert = job
+            font = load_led_font(size_label, font_path)
+            keys[job] = render_cache.make_key(text, size_label, color_name, font, invert, profile.width, profile.height)
+            hit = cache.get(keys[job])
+            if hit is not None:
+                payloads[job] = hit
+
+    todo = [job for job in dict.fromkeys(jobs) if job not in payloads]
+    if todo:
+        if executor is None and (len(todo) == 1 or max_workers == 1):
+            blobs = [_render_batch_job(job, renderer, profile) for job in todo]
+        else:
+            pool = executor
+            if pool is None:
+                fonts = list(dict.fromkeys((job[1], job[3]) for job in todo))
+                pool = ProcessPoolExecutor(
+                    max_workers, initializer=_init_batch_worker, initargs=(fonts,)
+                )
+            try:
+                workers = getattr(pool, "_max_workers", None) or os.cpu_count() or 1
+                chunksize = max(1, len(todo) // (workers * 4))
+                blobs = list(pool.map(
+                    _render_batch_job, todo,
+                    [renderer] * len(todo), [profile] * len(todo),
+                    chunksize=chunksize,
+                ))
+            finally:
+                if executor is None:
+                    pool.shutdown()
+
+        size = profile.payload_bytes
+        for job, blob in zip(todo, blobs):
+            payloads[job] = [blob[i:i + size] for i in range(0, len(blob), size)]
+            if cache is not None:
+                cache.put(keys[job], payloads[job])
+
+    return [_from_payloads(payloads[job], packed, as_frames, profile) for job in jobs]